@@ -1,23 +1,18 @@
-from google import genai
 import os
-from dotenv import load_dotenv
+import sys
 from pydantic import BaseModel
 import json
 
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.gemini_client import generate_content
+
 class EnglishAdjectives(BaseModel):
     word: str
     definition: str
     example: str
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Get API key from environment variable
-api_key = os.getenv("GOOGLE_AI_API_KEY")
-
-client = genai.Client(api_key=api_key)
-
-response = client.models.generate_content(
+response = generate_content(
     model="gemini-2.0-flash",
     contents="Generate 10 English adjectives with their definitions and examples",
     config={
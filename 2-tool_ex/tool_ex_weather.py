@@ -1,16 +1,14 @@
-from google import genai
-from google.genai import types
 import os
-from dotenv import load_dotenv
+import sys
 import requests
 
-# Load environment variables from .env file
-load_dotenv()
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.tool_loop import ToolRegistry, run_tool_loop
+from shared.forecast_cache import ForecastCache
 
-# Get API key from environment variable
-api_key = os.getenv("GOOGLE_AI_API_KEY")
-
-client = genai.Client(api_key=api_key)
+# Nearby coordinates share one forecast until the next hourly update
+forecast_cache = ForecastCache(grid=0.1, update_interval=3600)
 
 def get_weather(latitude: float, longitude: float) -> dict:
     """
@@ -24,6 +22,10 @@ def get_weather(latitude: float, longitude: float) -> dict:
         dict: A dictionary with today's date and min/max temperatures.
               Returns None if the request fails.
     """
+    return forecast_cache.get(latitude, longitude, fetch=fetch_forecast, variant="daily-min-max")
+
+def fetch_forecast(latitude: float, longitude: float) -> dict:
+    """Requests today's min/max temperatures from Open-Meteo. Returns None if the request fails."""
     url = "https://api.open-meteo.com/v1/forecast"
     params = {
         "latitude": latitude,
@@ -52,95 +54,19 @@ def get_weather(latitude: float, longitude: float) -> dict:
         print("API request failed with status code:", response.status_code)
         return None
 
-# Define the function declaration manually
-weather_function_declaration = types.FunctionDeclaration(
-    name="get_weather",
-    description="Retrieves today's temperature data for the specified coordinates",
-    parameters={
-        "type": "object",
-        "properties": {
-            "latitude": {
-                "type": "number",
-                "description": "The latitude of the location"
-            },
-            "longitude": {
-                "type": "number",
-                "description": "The longitude of the location"
-            }
-        },
-        "required": ["latitude", "longitude"]
-    }
-)
+# The function declaration is generated from get_weather's signature and docstring
+tools = ToolRegistry([get_weather])
 
-# Updated configuration according to the latest Gemini API
-# Note: In the latest Gemini API, the function_calling_config should be placed in tool_config
-# instead of directly in the Tool object
-first_prompt = "What is the weather in Konya?"
+# The model may ask for several cities in one turn; every function_call part is
+# executed concurrently and the loop continues until the model answers with text
+first_prompt = "What is the weather in Konya and Izmir?"
 model_id = "gemini-2.0-flash"
-response = client.models.generate_content(
-    contents=[first_prompt],
-    model=model_id,
-    config=types.GenerateContentConfig(
-        tools=[types.Tool(
-            function_declarations=[weather_function_declaration]
-        )],
-        tool_config=types.ToolConfig(
-            function_calling_config=types.FunctionCallingConfig(
-                mode="any",
-                allowed_function_names=["get_weather"]
-            )
-        ),
-        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=False)
-    )
-) 
+result = run_tool_loop(first_prompt, tools, model=model_id, max_rounds=3, require_tool_call=True)
 
-# Process the response and handle function calls
 print("Response received from Gemini API")
+for call in result.calls:
+    print(f"Function called: {call.name}")
+    print(f"Arguments: {call.args}")
+    print(f"Weather data: {call.response}")
 
-# Check if there are function calls in the response
-if hasattr(response.candidates[0].content.parts[0], 'function_call'):
-    function_call = response.candidates[0].content.parts[0].function_call
-    function_name = function_call.name
-    function_args = function_call.args
-    
-    print(f"Function called: {function_name}")
-    print(f"Arguments: {function_args}")
-    
-    # Execute the function with the provided arguments
-    if function_name == "get_weather":
-        # Extract latitude and longitude from the arguments
-        latitude = function_args.get("latitude")
-        longitude = function_args.get("longitude")
-        
-        # Call the get_weather function
-        weather_data = get_weather(latitude, longitude)
-        print(f"Weather data: {weather_data}")
-        
-        # Send the function response back to the model using the correct format
-        # Note: In the latest Gemini API, we need to use the types.Content and types.Part classes
-        # to structure the conversation history correctly
-        follow_up = client.models.generate_content(
-            model=model_id,
-            contents=[
-                types.Content(
-                    parts=[types.Part(text=first_prompt)],
-                    role="user"
-                ),
-                types.Content(
-                    parts=[types.Part(function_call=function_call)],
-                    role="model"
-                ),
-                types.Content(
-                    parts=[types.Part(function_response=types.FunctionResponse(
-                        name=function_name,
-                        response=weather_data
-                    ))],
-                    role="function"
-                )
-            ]
-        )
-        
-        print(f"Final response: {follow_up.text}")
-else:
-    # If there's no function call, print the text response
-    print(f"Text response: {response.text}")
\ No newline at end of file
+print(f"Final response: {result.text}")
@@ -0,0 +1,224 @@
+"""
+Hot-reloadable knowledge base for the customer service retriever.
+
+``KnowledgeBase`` keeps the parsed ``data.json`` and the indexes built from
+it in memory. ``refresh()`` checks the file's mtime/size first and its
+content hash second, so an unchanged file costs one ``stat`` call. When the
+file did change, only top-level sections whose content hash differs are
+re-flattened, re-analyzed and re-embedded; the rest are reused. The new
+state is published by swapping a single immutable snapshot reference, so
+readers never wait for a reload and never see a half-built index.
+
+Usage:
+    knowledge_base = KnowledgeBase("data.json")
+    knowledge_base.start_watching(interval=2.0)
+    knowledge_base.search("iade", top_k=3)
+"""
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from retrieval_engine import BM25Index, CustomerServiceRetriever, Passage, flatten_section, passage_terms
+from vector_index import DenseIndex, EmbedFunction, embed_passages, passages_fingerprint, save_matrix
+
+
+@dataclass(frozen=True)
+class SectionState:
+    """Derived data of one top-level section, reused while its content is unchanged."""
+
+    digest: str
+    passages: Tuple[Passage, ...]
+    terms: Tuple[List[str], ...]
+    embeddings: Optional[np.ndarray] = None
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Immutable view of the knowledge base that readers search against."""
+
+    version: int
+    data: Dict[str, Any]
+    sections: Dict[str, SectionState]
+    retriever: CustomerServiceRetriever
+
+
+def _section_digest(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class KnowledgeBase:
+    """
+    In-memory knowledge base with change detection and incremental rebuilds.
+
+    Parameters:
+        path (str): Path to the JSON knowledge base.
+        mode (str): Retrieval mode passed to ``CustomerServiceRetriever``.
+        embed: Optional embedding function; enables the dense index.
+        embeddings_path (str): Optional ``.npy`` file to store embeddings in,
+            so a restart does not re-embed unchanged passages.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "bm25",
+        embed: Optional[EmbedFunction] = None,
+        embeddings_path: Optional[str] = None,
+    ):
+        self.path = path
+        self.mode = mode
+        self.embed = embed
+        self.embeddings_path = embeddings_path
+        self.reloads = 0
+        self.sections_rebuilt = 0
+        self._snapshot: Optional[Snapshot] = None
+        self._file_stat: Optional[Tuple[int, int]] = None
+        self._file_digest: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+        self.refresh()
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """The current snapshot. Reading it never blocks."""
+        return self._snapshot
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """Search the current snapshot."""
+        return self._snapshot.retriever.search(query, top_k)
+
+    def refresh(self) -> bool:
+        """
+        Reload the file if it changed since the last check.
+
+        Returns:
+            bool: True if a new snapshot was published.
+        """
+        with self._reload_lock:
+            stat = os.stat(self.path)
+            file_stat = (stat.st_mtime_ns, stat.st_size)
+            if file_stat == self._file_stat:
+                return False
+
+            with open(self.path, "rb") as file:
+                raw = file.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest == self._file_digest:
+                # Touched but not modified
+                self._file_stat = file_stat
+                return False
+
+            try:
+                data = json.loads(raw.decode("utf-8"))
+            except ValueError as e:
+                # The file is probably being edited; keep serving the previous snapshot
+                print(f"Error loading knowledge base, keeping previous version: {e}")
+                if self._snapshot is None:
+                    raise
+                return False
+
+            self._publish(data)
+            self._file_stat = file_stat
+            self._file_digest = digest
+            return True
+
+    def start_watching(self, interval: float = 2.0):
+        """Check the file for changes every ``interval`` seconds in a background thread."""
+        if self._watcher is not None:
+            return
+        self._stop_watching.clear()
+
+        def watch():
+            last_error = None
+            while not self._stop_watching.wait(interval):
+                # Any failure (I/O, embedding API, unexpected JSON shape) keeps the previous
+                # snapshot; the file is not marked as loaded, so the next tick tries again
+                try:
+                    self.refresh()
+                    last_error = None
+                except Exception as e:
+                    if str(e) != last_error:
+                        print(f"Error reloading knowledge base, keeping previous version: {e!r}")
+                    last_error = str(e)
+
+        self._watcher = threading.Thread(target=watch, name="knowledge-base-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        """Stop the background watcher thread."""
+        if self._watcher is not None:
+            self._stop_watching.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _publish(self, data: Dict[str, Any]):
+        previous = self._snapshot.sections if self._snapshot else {}
+        first_load = self._snapshot is None
+        sections: Dict[str, SectionState] = {}
+        changed: List[str] = []
+
+        for name, value in data.items():
+            digest = _section_digest(value)
+            old = previous.get(name)
+            if old is not None and old.digest == digest:
+                sections[name] = old
+                continue
+            passages = tuple(flatten_section(name, value))
+            sections[name] = SectionState(digest, passages, tuple(passage_terms(p) for p in passages))
+            changed.append(name)
+
+        passages = [passage for state in sections.values() for passage in state.passages]
+        terms = [doc_terms for state in sections.values() for doc_terms in state.terms]
+        dense_index = None
+        if self.embed is not None:
+            if first_load and self.embeddings_path:
+                # Reuse the stored matrix from an earlier run when nothing changed
+                dense_index = DenseIndex.open_or_build(passages, self.embed, self.embeddings_path)
+                sections = self._split_embeddings(sections, dense_index.matrix)
+            else:
+                sections = self._embed_sections(sections, changed)
+                matrix = np.vstack(
+                    [state.embeddings for state in sections.values() if len(state.passages)]
+                    or [np.zeros((0, 1), dtype=np.float32)]
+                )
+                dense_index = DenseIndex(passages, matrix, self.embed)
+                if self.embeddings_path:
+                    name = getattr(self.embed, "name", type(self.embed).__name__)
+                    save_matrix(self.embeddings_path, matrix, passages_fingerprint(passages, name), name)
+
+        retriever = CustomerServiceRetriever(
+            passages,
+            mode=self.mode,
+            index=BM25Index(passages, terms=terms),
+            dense_index=dense_index,
+        )
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        # Publishing is a single reference assignment, readers see either the old or the new snapshot
+        self._snapshot = Snapshot(version, data, sections, retriever)
+        self.reloads += 1
+        self.sections_rebuilt += len(changed)
+
+    def _embed_sections(self, sections: Dict[str, SectionState], changed: List[str]) -> Dict[str, SectionState]:
+        updated = dict(sections)
+        for name in changed:
+            state = sections[name]
+            embeddings = embed_passages(state.passages, self.embed)
+            updated[name] = SectionState(state.digest, state.passages, state.terms, embeddings)
+        return updated
+
+    @staticmethod
+    def _split_embeddings(sections: Dict[str, SectionState], matrix: np.ndarray) -> Dict[str, SectionState]:
+        updated = {}
+        row = 0
+        for name, state in sections.items():
+            count = len(state.passages)
+            updated[name] = SectionState(state.digest, state.passages, state.terms, matrix[row:row + count])
+            row += count
+        return updated
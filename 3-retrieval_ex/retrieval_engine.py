@@ -0,0 +1,253 @@
+"""
+Lexical retrieval over the customer service knowledge base.
+
+The nested JSON document is flattened into short passages once, and an
+inverted BM25 index is built over them. Text is normalized for Turkish
+(dotted/dotless i case folding, ASCII folding of Turkish letters, a small
+suffix-stripping stemmer) so that e.g. "İadelerimi" matches "iade".
+"""
+import heapq
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Dicts with only scalar values whose combined text is shorter than this are
+# kept together as one passage (e.g. contact details, opening hours)
+GROUP_MAX_CHARS = 300
+
+_TURKISH_UPPER = str.maketrans({"I": "ı", "İ": "i"})
+_ASCII_FOLD = str.maketrans({"ç": "c", "ğ": "g", "ı": "i", "ö": "o", "ş": "s", "ü": "u", "â": "a", "î": "i", "û": "u"})
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_CAMEL_CASE = re.compile(r"(?<=[a-zçğıöşü])(?=[A-ZÇĞİÖŞÜ])")
+
+STOPWORDS = {
+    "ve", "veya", "ile", "bir", "bu", "su", "o", "icin", "mi", "mu", "de", "da", "ne",
+    "nasil", "ben", "sen", "biz", "siz", "ki", "gibi", "daha", "cok", "en", "olarak",
+    "ya", "yada", "hem", "ama", "fakat", "her",
+}
+
+# Common Turkish inflectional suffixes (ASCII folded), longest first
+SUFFIXES = sorted(
+    [
+        "lerinden", "larindan", "lerinde", "larinda", "lerini", "larini", "lerine", "larina",
+        "leri", "lari", "ler", "lar", "inizi", "iniz", "unuz", "imiz", "umuz", "niz", "nuz",
+        "inin", "unun", "nin", "nun", "dan", "den", "tan", "ten", "nda", "nde", "ndan", "nden",
+        "yla", "yle", "la", "le", "da", "de", "ta", "te", "in", "un", "im", "um",
+        "si", "su", "ya", "ye", "yi", "yu", "mek", "mak", "iyor", "uyor", "yor",
+        "ebilirsiniz", "abilirsiniz", "ebilir", "abilir", "mis", "mus", "dir", "dur", "tir", "tur",
+        "i", "u", "a", "e",
+    ],
+    key=len,
+    reverse=True,
+)
+MIN_STEM_LENGTH = 3
+
+
+def normalize(text: str) -> str:
+    """Turkish-aware lowercase and ASCII folding."""
+    return text.translate(_TURKISH_UPPER).lower().translate(_ASCII_FOLD)
+
+
+def stem(token: str) -> str:
+    """
+    Strip inflectional suffixes until none is left, keeping a minimum stem length.
+
+    Stripping runs to a fixed point so that a bare word and its inflected forms
+    end on the same stem, however many suffixes are stacked.
+    """
+    while True:
+        for suffix in SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+                token = token[: -len(suffix)]
+                break
+        else:
+            return token
+
+
+def analyze(text: str) -> List[str]:
+    """
+    Turn text into the index terms used by BM25.
+
+    >>> analyze("İadelerimi") == analyze("iade") == analyze("iadeyi")
+    True
+    >>> analyze("Kargolarınızı") == analyze("kargo")
+    True
+    """
+    return [
+        stem(token)
+        for token in _TOKEN_PATTERN.findall(normalize(text))
+        if token not in STOPWORDS
+    ]
+
+
+def humanize_key(key: str) -> str:
+    """Turn a camelCase JSON key like 'iadeVeDegisim' into 'iade Ve Degisim'."""
+    return _CAMEL_CASE.sub(" ", key)
+
+
+@dataclass(frozen=True)
+class Passage:
+    section: str
+    path: str
+    text: str
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"section": self.section, "path": self.path, "text": self.text}
+
+
+def _is_scalar(value: Any) -> bool:
+    return not isinstance(value, (dict, list))
+
+
+def _flatten(value: Any, path: List[str], section: str, passages: List[Passage]):
+    label = " > ".join(humanize_key(part) for part in path)
+    if isinstance(value, dict):
+        if value and all(_is_scalar(item) for item in value.values()):
+            lines = [f"{humanize_key(key)}: {item}" for key, item in value.items()]
+            if sum(len(line) for line in lines) <= GROUP_MAX_CHARS:
+                passages.append(Passage(section, label, "\n".join(lines)))
+                return
+        for key, item in value.items():
+            _flatten(item, path + [key], section, passages)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            _flatten(item, path + [str(index)], section, passages)
+    elif value is not None and str(value).strip():
+        passages.append(Passage(section, label, str(value)))
+
+
+def flatten_section(section: str, value: Any) -> List[Passage]:
+    """Flatten one top-level section of the knowledge base into passages."""
+    passages: List[Passage] = []
+    _flatten(value, [section], section, passages)
+    return passages
+
+
+def flatten_passages(data: Dict[str, Any]) -> List[Passage]:
+    """Flatten the nested knowledge base JSON into passages."""
+    passages: List[Passage] = []
+    for section, value in data.items():
+        passages.extend(flatten_section(section, value))
+    return passages
+
+
+def passage_terms(passage: Passage) -> List[str]:
+    """Index terms of a passage. The path is indexed too, so section names like "iade" are searchable."""
+    return analyze(f"{passage.path} {passage.text}")
+
+
+class BM25Index:
+    """Inverted BM25 index over passages."""
+
+    def __init__(
+        self,
+        passages: List[Passage],
+        k1: float = 1.5,
+        b: float = 0.75,
+        terms: Optional[List[List[str]]] = None,
+    ):
+        """
+        Parameters:
+            passages: Passages to index.
+            k1, b: BM25 parameters.
+            terms: Already analyzed terms of every passage (see ``passage_terms``),
+                to skip re-analyzing passages that did not change.
+        """
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+        if terms is None:
+            terms = [passage_terms(passage) for passage in passages]
+
+        for doc_id, doc_terms in enumerate(terms):
+            self.doc_lengths.append(len(doc_terms))
+            for term, frequency in Counter(doc_terms).items():
+                self.postings[term].append((doc_id, frequency))
+
+        doc_count = len(passages)
+        self.avg_doc_length = sum(self.doc_lengths) / doc_count if doc_count else 0.0
+        self.idf = {
+            term: math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, Passage]]:
+        """Return the ``top_k`` best matching passages as (score, passage) pairs."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(analyze(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, frequency in self.postings[term]:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, self.passages[doc_id]) for doc_id, score in best]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[float, Passage]]], k: int = 60) -> List[Tuple[float, Passage]]:
+    """Merge several ranked result lists into one using reciprocal rank fusion."""
+    fused: Dict[Passage, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, (_, passage) in enumerate(ranking):
+            fused[passage] += 1.0 / (k + rank + 1)
+    return sorted(((score, passage) for passage, score in fused.items()), key=lambda item: item[0], reverse=True)
+
+
+class CustomerServiceRetriever:
+    """
+    Loads the knowledge base once and answers queries with the top passages.
+
+    ``mode`` selects the search: "bm25" (lexical), "dense" (embeddings, needs
+    ``dense_index``) or "hybrid" (both, merged with reciprocal rank fusion).
+    """
+
+    def __init__(
+        self,
+        passages: List[Passage],
+        mode: str = "bm25",
+        index: Optional[BM25Index] = None,
+        dense_index=None,
+    ):
+        self.passages = passages
+        self.index = index if index is not None else BM25Index(passages)
+        self.dense_index = dense_index
+        self.mode = mode
+
+    @classmethod
+    def from_data(cls, data: Dict[str, Any], **kwargs) -> "CustomerServiceRetriever":
+        return cls(flatten_passages(data), **kwargs)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "CustomerServiceRetriever":
+        with open(path, "r", encoding="utf-8") as file:
+            return cls.from_data(json.load(file), **kwargs)
+
+    def attach_dense_index(self, dense_index):
+        """Use a ``vector_index.DenseIndex`` built over ``self.passages``."""
+        self.dense_index = dense_index
+
+    def _ranked(self, query: str, top_k: int) -> List[Tuple[float, Passage]]:
+        if self.mode == "bm25" or self.dense_index is None:
+            return self.index.search(query, top_k)
+        if self.mode == "dense":
+            return self.dense_index.search(query, top_k)
+        # Fetch a few extra candidates from each side so fusion has something to merge
+        candidates = top_k * 3
+        return reciprocal_rank_fusion([
+            self.index.search(query, candidates),
+            self.dense_index.search(query, candidates),
+        ])[:top_k]
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """Return the ``top_k`` passages for a query as plain dicts."""
+        return [
+            {**passage.as_dict(), "score": round(score, 4)}
+            for score, passage in self._ranked(query, top_k)
+        ]
@@ -1,96 +1,60 @@
-from google import genai
 import os
-from dotenv import load_dotenv
-import json
-from google.genai import types
-# Load environment variables from .env file
-load_dotenv()
-
-# Get API key from environment variable
-api_key = os.getenv("GOOGLE_AI_API_KEY")
-
-client = genai.Client(api_key=api_key)
+import sys
+
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.tool_loop import ToolRegistry, run_tool_loop
+from knowledge_base import KnowledgeBase
+from vector_index import GeminiEmbedder, HashingEmbedder
+
+# Get the directory of the current script
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Create the absolute path to data.json
+data_file_path = os.path.join(script_dir, "data.json")
+# Stored passage embeddings, memory-mapped on later runs
+embeddings_file_path = os.path.join(script_dir, "data.embeddings.npy")
+
+# "bm25" (lexical), "dense" (embeddings) or "hybrid" (both)
+retrieval_mode = os.getenv("RETRIEVAL_MODE", "bm25")
+embedder = None
+if retrieval_mode != "bm25":
+    # RETRIEVAL_EMBEDDER=hashing uses the offline embedder instead of the Gemini API
+    embedder = HashingEmbedder() if os.getenv("RETRIEVAL_EMBEDDER") == "hashing" else GeminiEmbedder()
+
+# Flatten data.json into passages and build the search indexes once at startup.
+# Edits to data.json are picked up in the background; only changed sections are rebuilt.
+knowledge_base = KnowledgeBase(
+    data_file_path,
+    mode=retrieval_mode,
+    embed=embedder,
+    embeddings_path=embeddings_file_path if embedder else None,
+)
+knowledge_base.start_watching(interval=2.0)
 
-def take_a_look_at_the_customer_service_data() -> dict:
+def take_a_look_at_the_customer_service_data(query: str, top_k: int = 3) -> dict:
     """
-    Retrieves customer service data from the data.json file.
+    Searches the customer service data (data.json) for the passages most relevant to a query.
     
     Parameters:
-        None
+        query (str): What the customer is asking about, e.g. "iade nasıl yapılır".
+        top_k (int): Maximum number of passages to return.
     
     Returns:
-        dict: A dictionary with customer service data.
+        dict: A dictionary with the best matching passages under "results".
     """
-    # Get the directory of the current script
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    # Create the absolute path to data.json
-    data_file_path = os.path.join(script_dir, "data.json")
-    
-    with open(data_file_path, "r") as file:
-        data = json.load(file)
-    return data
+    return {"results": knowledge_base.search(query, top_k)}
 
-customer_service_function_declaration = types.FunctionDeclaration(
-    name="take_a_look_at_the_customer_service_data",
-    description="Retrieves customer service data"
-)
+# The function declaration is generated from the signature and docstring above
+tools = ToolRegistry([take_a_look_at_the_customer_service_data])
 
 first_prompt = "Ürünümü iade etmek istiyorum. Nasıl yaparım?"
 model_id = "gemini-2.0-flash"
-response = client.models.generate_content(
-    contents=[first_prompt],
-    model=model_id,
-    config=types.GenerateContentConfig(
-        tools=[types.Tool(
-            function_declarations=[customer_service_function_declaration]
-        )],
-        tool_config=types.ToolConfig(
-            function_calling_config=types.FunctionCallingConfig(
-                mode="any",
-                allowed_function_names=["take_a_look_at_the_customer_service_data"]
-            )
-        ),
-        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=False)
-    )
-)
-# Process the response and handle function calls
-print("Response received from Gemini API")
-
-# Check if there are function calls in the response
-if hasattr(response.candidates[0].content.parts[0], 'function_call'):
-    function_call = response.candidates[0].content.parts[0].function_call
-    function_name = function_call.name
-    function_args = function_call.args
-    
-    print(f"Function called: {function_name}")
-    print(f"Arguments: {function_args}")
+result = run_tool_loop(first_prompt, tools, model=model_id, max_rounds=3, require_tool_call=True)
 
-    if function_name == "take_a_look_at_the_customer_service_data":
-        customer_service_data = take_a_look_at_the_customer_service_data()
-        print(f"Customer service data: {customer_service_data}")
-
-        follow_up = client.models.generate_content(
-            model=model_id,
-            contents=[
-                types.Content(
-                    parts=[types.Part(text=first_prompt)],
-                    role="user"
-                ),
-                types.Content(
-                    parts=[types.Part(function_call=function_call)],
-                    role="model"
-                ),
-                types.Content(
-                    parts=[types.Part(function_response=types.FunctionResponse(
-                        name=function_name,
-                        response=customer_service_data
-                    ))],
-                    role="function"
-                )
-            ]
-        )
-        print(f"Final response: {follow_up.text}")
-else:
-    # If there's no function call, print the text response
-    print(f"Final response: {response.text}")
+print("Response received from Gemini API")
+for call in result.calls:
+    print(f"Function called: {call.name}")
+    print(f"Arguments: {call.args}")
+    print(f"Customer service data: {call.response}")
 
+print(f"Final response: {result.text}")
@@ -0,0 +1,170 @@
+"""
+Dense vector index for the customer service retriever.
+
+Passages are embedded once and stored as a contiguous float32 matrix in a
+``.npy`` file. On later starts the file is memory-mapped instead of
+re-embedding anything, as long as the passages and the embedder are
+unchanged. Search is a batched matrix product followed by ``argpartition``
+to pick the top-k rows.
+
+The embedding function is pluggable: any callable that maps a list of texts
+to an ``(n, dim)`` array works. ``HashingEmbedder`` is deterministic and
+offline (useful for tests), ``GeminiEmbedder`` calls the embedding API.
+"""
+import hashlib
+import json
+import os
+import sys
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from retrieval_engine import Passage, analyze
+
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.gemini_client import embed_content
+
+EmbedFunction = Callable[[List[str]], np.ndarray]
+
+# Number of passages sent to the embedder at once while building the index
+EMBED_BATCH_SIZE = 100
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _passage_text(passage: Passage) -> str:
+    return f"{passage.path}\n{passage.text}"
+
+
+class HashingEmbedder:
+    """Deterministic feature-hashing embedder over analyzed tokens and token bigrams."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = analyze(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                column, sign = self._bucket(feature)
+                matrix[row, column] += sign
+        return _normalize_rows(matrix)
+
+
+class GeminiEmbedder:
+    """Embeds texts with the Gemini embedding API through the shared client."""
+
+    def __init__(self, model: str = "text-embedding-004"):
+        self.model = model
+        self.name = f"gemini-{model}"
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        response = embed_content(model=self.model, contents=texts)
+        return np.asarray([embedding.values for embedding in response.embeddings], dtype=np.float32)
+
+
+def passages_fingerprint(passages: Sequence[Passage], embedder_name: str) -> str:
+    """Hash of the embedder and passage contents, used to decide if a stored index is still valid."""
+    digest = hashlib.sha256(embedder_name.encode("utf-8"))
+    for passage in passages:
+        digest.update(b"\0")
+        digest.update(_passage_text(passage).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def embed_passages(passages: Sequence[Passage], embed: EmbedFunction, batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed passages in batches into one contiguous, row-normalized float32 matrix."""
+    texts = [_passage_text(passage) for passage in passages]
+    batches = [
+        np.asarray(embed(texts[start:start + batch_size]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size)
+    ]
+    if not batches:
+        return np.zeros((0, getattr(embed, "dim", 1)), dtype=np.float32)
+    return np.ascontiguousarray(_normalize_rows(np.vstack(batches)))
+
+
+def save_matrix(path: str, matrix: np.ndarray, fingerprint: str, embedder_name: str):
+    """Store an embedding matrix and its ``<path>.meta.json`` fingerprint file."""
+    meta_path = f"{path}.meta.json"
+    # Write to temporary files first so a crash never leaves a half-written index
+    np.save(f"{path}.tmp.npy", matrix)
+    os.replace(f"{path}.tmp.npy", path)
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "rows": int(matrix.shape[0]), "embedder": embedder_name}, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+
+class DenseIndex:
+    """Cosine-similarity top-k search over a (memory-mapped) embedding matrix."""
+
+    def __init__(self, passages: Sequence[Passage], matrix: np.ndarray, embed: EmbedFunction):
+        if len(passages) != matrix.shape[0]:
+            raise ValueError("Number of passages and embedding rows do not match")
+        self.passages = list(passages)
+        self.matrix = matrix
+        self.embed = embed
+
+    @classmethod
+    def open_or_build(
+        cls,
+        passages: Sequence[Passage],
+        embed: EmbedFunction,
+        path: str,
+        embedder_name: Optional[str] = None,
+    ) -> "DenseIndex":
+        """
+        Memory-map the stored index at ``path`` if it matches the passages,
+        otherwise embed the passages and store a new one.
+
+        A ``<path>.meta.json`` file next to the matrix records the fingerprint.
+        """
+        embedder_name = embedder_name or getattr(embed, "name", type(embed).__name__)
+        fingerprint = passages_fingerprint(passages, embedder_name)
+        meta_path = f"{path}.meta.json"
+
+        if os.path.exists(path) and os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("fingerprint") == fingerprint:
+                matrix = np.load(path, mmap_mode="r")
+                return cls(passages, matrix, embed)
+
+        matrix = embed_passages(passages, embed)
+        save_matrix(path, matrix, fingerprint, embedder_name)
+        return cls(passages, np.load(path, mmap_mode="r"), embed)
+
+    def search_vectors(self, queries: np.ndarray, top_k: int = 3) -> List[List[Tuple[float, Passage]]]:
+        """Return the ``top_k`` passages for every row of an ``(n, dim)`` query matrix."""
+        if not self.passages:
+            return [[] for _ in range(len(queries))]
+        scores = _normalize_rows(np.atleast_2d(queries).astype(np.float32)) @ self.matrix.T
+        k = min(top_k, scores.shape[1])
+        # argpartition finds the top-k in O(n); only those k are sorted
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([(float(scores[row, i]), self.passages[i]) for i in ordered])
+        return results
+
+    def search_batch(self, queries: List[str], top_k: int = 3) -> List[List[Tuple[float, Passage]]]:
+        """Embed several queries at once and search them with one matrix product."""
+        return self.search_vectors(np.asarray(self.embed(queries), dtype=np.float32), top_k)
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, Passage]]:
+        """Return the ``top_k`` best matching passages as (score, passage) pairs."""
+        return self.search_batch([query], top_k)[0]
@@ -1,15 +1,20 @@
-from google import genai
 import os
-from dotenv import load_dotenv
+import sys
 from pydantic import BaseModel, Field
 import json
 import logging
 from datetime import datetime
-from typing import Optional
-# Load environment variables from .env file
-load_dotenv()
-api_key = os.getenv("GOOGLE_AI_API_KEY")
-client = genai.Client(api_key=api_key)
+from typing import Dict, Iterable, List, Optional, Union
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.gemini_client import agenerate_structured, generate_structured
+from shared.response_cache import get_default_cache
+
 model_id = "gemini-2.0-pro-exp-02-05"
 
 class EventExtraction(BaseModel):
@@ -35,28 +40,108 @@ class EventConfirmation(BaseModel):
     """
     confirmation_message: str = Field(description="Natural language confirmation message")
 
-def extract_event_info(text: str) -> EventExtraction:
+# Minimum confidence for a text to be treated as a calendar event
+CONFIDENCE_THRESHOLD = 0.7
+
+# Runs speculative details extractions next to the gate check (speculative=True)
+_speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-details")
+
+@dataclass
+class ChainMetrics:
     """
-    Extracts event information from a text.
+    Timings of one run of the chain; pass an instance as ``metrics`` to have it filled in.
     """
-    print("Starting event extraction")
-    print(f"Extracting event information from text: {text}")
+    speculative: bool = False
+    gate_passed: Optional[bool] = None
+    info_seconds: float = 0.0
+    # Time spent waiting for the details after the gate (short when speculation paid off)
+    details_seconds: float = 0.0
+    confirmation_seconds: float = 0.0
+    total_seconds: float = 0.0
+    # Speculative details calls thrown away because the gate rejected the text
+    wasted_calls: int = 0
+    wasted_seconds: float = 0.0
+
+class _SpeculationTimer:
+    """Records when a speculative call ran, to report the wasted time if it is discarded."""
+
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def wrap(self, func):
+        def run(*args):
+            self.started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.finished = time.perf_counter()
+        return run
+
+    def awrap(self, func):
+        async def run(*args):
+            self.started = time.perf_counter()
+            try:
+                return await func(*args)
+            finally:
+                self.finished = time.perf_counter()
+        return run
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+def build_event_info_prompt(text: str) -> str:
     today = datetime.now().strftime('%A, %B %d, %Y')
-    prompt = f"""
+    return f"""
     Today is {today}.
     Analyze the following text and extract if the text describes a calendar event.
     Text: {text}
     """
 
-    response = client.models.generate_content(
-    model=model_id,
-    contents=[prompt],
-    config={
-        "response_mime_type": "application/json",
-            "response_schema": EventExtraction
-        }
+def build_event_details_prompt(description: str) -> str:
+    today = datetime.now().strftime('%A, %B %d, %Y')
+    return f"""
+    Today is {today}. Use this date to understand the references like "tomorrow" or "next week".
+    Analyze the following description and extract the event details.
+    Description: {description}
+    """
+
+def build_confirmation_prompt(event_details: EventDetails) -> str:
+    return f"""
+    Generate a natural confirmation message for the event. Sign of with your name; Susie
+    <example>
+    Dear Ismail,
+
+    I hope this message finds you well. I am pleased to inform you that the event has been accepted. 
+    I would like to meet with you at 02-02-2025 at 10:00 to discuss the details further.
+    Thank you for your attention, and I look forward to our meeting.
+    Best regards,
+
+    Susie
+    </example>
+    Use the example but be creative about details.
+    Event Details: {event_details.model_dump()}
+    """
+
+def passes_gate(event_check: EventExtraction) -> bool:
+    """Whether the text is a calendar event with enough confidence to continue the chain."""
+    return event_check.is_calendar_event and event_check.confidence_score >= CONFIDENCE_THRESHOLD
+
+def extract_event_info(text: str) -> EventExtraction:
+    """
+    Extracts event information from a text.
+    """
+    print("Starting event extraction")
+    print(f"Extracting event information from text: {text}")
+
+    result = generate_structured(
+        model=model_id,
+        contents=[build_event_info_prompt(text)],
+        schema=EventExtraction,
+        cache=get_default_cache()
     )
-    result = response.parsed
     print(
         f"Extraction complete - Is calendar event: {result.is_calendar_event}, Confidence: {result.confidence_score:.2f}"
     )
@@ -68,23 +153,13 @@ def extract_event_details(description: str) -> EventDetails:
     """
     print("Starting event details extraction")
     print(f"Extracting event details from description: {description}")
-    today = datetime.now().strftime('%A, %B %d, %Y')
-
-    prompt = f"""
-    Today is {today}. Use this date to understand the references like "tomorrow" or "next week".
-    Analyze the following description and extract the event details.
-    Description: {description}
-    """
 
-    response = client.models.generate_content(
+    # Identical requests in flight at the same time (retries, double submits) share one call
+    result = generate_structured(
         model=model_id,
-        contents=[prompt],
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": EventDetails
-        }
+        contents=[build_event_details_prompt(description)],
+        schema=EventDetails
     )
-    result = response.parsed
     print(
         f"Extraction complete - Name: {result.name}, Date: {result.date}, Duration: {result.duration_minutes}, Participants: {result.participants}"
     )
@@ -97,68 +172,226 @@ def generate_confirmation_message(event_details: EventDetails) -> EventConfirmat
     print("Starting confirmation message generation")
     print(f"Generating confirmation message for event: {event_details}")
 
-    prompt = f"""
-    Generate a natural confirmation message for the event. Sign of with your name; Susie
-    <example>
-    Dear Ismail,
-
-    I hope this message finds you well. I am pleased to inform you that the event has been accepted. 
-    I would like to meet with you at 02-02-2025 at 10:00 to discuss the details further.
-    Thank you for your attention, and I look forward to our meeting.
-    Best regards,
-
-    Susie
-    </example>
-    Use the example but be creative about details.
-    Event Details: {event_details.model_dump()}
-    """
-
-    completion = client.models.generate_content(
+    result = generate_structured(
         model=model_id,
-        contents=[prompt],
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": EventConfirmation
-        }
+        contents=[build_confirmation_prompt(event_details)],
+        schema=EventConfirmation
     )
-    result = completion.parsed
     print(
         f"Confirmation message generated: {result.confirmation_message}"
     )
     return result
 
-def process_event_request(text: str) -> Optional[EventConfirmation]:
+def process_event_request(text: str, speculative: bool = False,
+                          metrics: Optional[ChainMetrics] = None) -> Optional[EventConfirmation]:
     """
     Processes an event request and returns a confirmation message.
+
+    With ``speculative=True`` the details are extracted from the raw text at
+    the same time as the gate check instead of after it, and thrown away if
+    the gate rejects the text. This saves one model round trip for valid
+    requests at the cost of a wasted call for rejected ones.
     """
     print("Processing event request")
     print(f"Processing event request: {text}")
+    metrics = metrics if metrics is not None else ChainMetrics()
+    metrics.speculative = speculative
+    start = time.perf_counter()
+
+    timer = _SpeculationTimer()
+    speculation = _speculation_pool.submit(timer.wrap(extract_event_details), text) if speculative else None
 
     event_check = extract_event_info(text)
-    if (
-        not event_check.is_calendar_event
-        or event_check.confidence_score < 0.7
-    ):
+    metrics.info_seconds = time.perf_counter() - start
+    metrics.gate_passed = passes_gate(event_check)
+    if not metrics.gate_passed:
         print("Gatekeeping: Event is not a calendar event or confidence score is too low")
+        if speculation is not None:
+            # Cancelled if it has not started yet; otherwise it finishes unused
+            speculation.cancel()
+            metrics.wasted_calls = 1
+            metrics.wasted_seconds = timer.elapsed()
+        metrics.total_seconds = time.perf_counter() - start
         return None
     
     print("Event is a calendar event, extracting details")
 
-    event_details = extract_event_details(event_check.description)
+    step = time.perf_counter()
+    if speculation is not None:
+        event_details = speculation.result()
+    else:
+        event_details = extract_event_details(event_check.description)
+    metrics.details_seconds = time.perf_counter() - step
 
+    step = time.perf_counter()
     confirmation = generate_confirmation_message(event_details)
+    metrics.confirmation_seconds = time.perf_counter() - step
+    metrics.total_seconds = time.perf_counter() - start
 
     print("Confirmation message generated successfully")
     return confirmation
 
-appropriate_user_input = "I have a meeting with John tomorrow at 10am for 2 hours"
+async def aextract_event_info(text: str) -> EventExtraction:
+    """Async version of ``extract_event_info``."""
+    return await agenerate_structured(
+        model=model_id,
+        contents=[build_event_info_prompt(text)],
+        schema=EventExtraction,
+        cache=get_default_cache()
+    )
 
-confirmation = process_event_request(appropriate_user_input)
+async def aextract_event_details(description: str) -> EventDetails:
+    """Async version of ``extract_event_details``."""
+    return await agenerate_structured(
+        model=model_id,
+        contents=[build_event_details_prompt(description)],
+        schema=EventDetails
+    )
+
+async def agenerate_confirmation_message(event_details: EventDetails) -> EventConfirmation:
+    """Async version of ``generate_confirmation_message``."""
+    return await agenerate_structured(
+        model=model_id,
+        contents=[build_confirmation_prompt(event_details)],
+        schema=EventConfirmation
+    )
+
+async def aprocess_event_request(text: str, speculative: bool = False,
+                                 metrics: Optional[ChainMetrics] = None) -> Optional[EventConfirmation]:
+    """
+    Async version of ``process_event_request`` for a single text. A rejected
+    speculative details call is cancelled, which aborts its request.
+    """
+    metrics = metrics if metrics is not None else ChainMetrics()
+    metrics.speculative = speculative
+    start = time.perf_counter()
+
+    timer = _SpeculationTimer()
+    speculation = asyncio.create_task(timer.awrap(aextract_event_details)(text)) if speculative else None
+    try:
+        event_check = await aextract_event_info(text)
+    except BaseException:
+        if speculation is not None:
+            speculation.cancel()
+        raise
+    metrics.info_seconds = time.perf_counter() - start
+    metrics.gate_passed = passes_gate(event_check)
+    if not metrics.gate_passed:
+        if speculation is not None:
+            speculation.cancel()
+            metrics.wasted_calls = 1
+            metrics.wasted_seconds = timer.elapsed()
+        metrics.total_seconds = time.perf_counter() - start
+        return None
+
+    step = time.perf_counter()
+    if speculation is not None:
+        event_details = await speculation
+    else:
+        event_details = await aextract_event_details(event_check.description)
+    metrics.details_seconds = time.perf_counter() - step
+
+    step = time.perf_counter()
+    confirmation = await agenerate_confirmation_message(event_details)
+    metrics.confirmation_seconds = time.perf_counter() - step
+    metrics.total_seconds = time.perf_counter() - start
+    return confirmation
+
+async def process_event_requests_pipelined(
+    texts: Iterable[str],
+    info_workers: int = 4,
+    details_workers: int = 4,
+    confirmation_workers: int = 4,
+    queue_size: int = 8,
+) -> List[Union[EventConfirmation, None, Exception]]:
+    """
+    Run the chain over many texts as a pipeline.
+
+    Every stage (extraction + gate, details, confirmation) has its own bounded
+    queue and workers, so extraction of text N+1 overlaps with the later
+    stages of text N, and throughput is set by the concurrency limits rather
+    than by the sum of the stage latencies. ``texts`` is consumed lazily; a
+    full queue makes the previous stage wait.
+
+    Parameters:
+        texts: Input texts (any iterable, e.g. a generator over a mailbox).
+        info_workers (int): Concurrent extraction calls.
+        details_workers (int): Concurrent details calls.
+        confirmation_workers (int): Concurrent confirmation calls.
+        queue_size (int): Capacity of each stage's input queue.
+
+    Returns:
+        list: One entry per text, in input order: the confirmation, None if the
+              gate rejected the text, or the exception that stage raised.
+    """
+    results: Dict[int, Union[EventConfirmation, None, Exception]] = {}
+    info_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    details_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    confirmation_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def run_stage(queue: asyncio.Queue, stage):
+        while True:
+            index, value = await queue.get()
+            try:
+                await stage(index, value)
+            except Exception as e:
+                results[index] = e
+            finally:
+                queue.task_done()
+
+    async def info_stage(index: int, text: str):
+        event_check = await aextract_event_info(text)
+        if passes_gate(event_check):
+            await details_queue.put((index, event_check.description))
+        else:
+            results[index] = None
+
+    async def details_stage(index: int, description: str):
+        await confirmation_queue.put((index, await aextract_event_details(description)))
+
+    async def confirmation_stage(index: int, event_details: EventDetails):
+        results[index] = await agenerate_confirmation_message(event_details)
+
+    workers = (
+        [asyncio.create_task(run_stage(info_queue, info_stage)) for _ in range(info_workers)]
+        + [asyncio.create_task(run_stage(details_queue, details_stage)) for _ in range(details_workers)]
+        + [asyncio.create_task(run_stage(confirmation_queue, confirmation_stage)) for _ in range(confirmation_workers)]
+    )
+    try:
+        count = 0
+        for text in texts:
+            await info_queue.put((count, text))
+            count += 1
+        # A stage only finishes an item after handing it to the next queue, so joining in order is enough
+        await info_queue.join()
+        await details_queue.join()
+        await confirmation_queue.join()
+    finally:
+        for worker in workers:
+            worker.cancel()
+    return [results.get(index) for index in range(count)]
 
-unappropriate_user_input = "Can you tell me about the weather in Tokyo?"
+if __name__ == "__main__":
+    appropriate_user_input = "I have a meeting with John tomorrow at 10am for 2 hours"
 
-unappropriate_confirmation = process_event_request(unappropriate_user_input)
+    confirmation = process_event_request(appropriate_user_input)
 
+    unappropriate_user_input = "Can you tell me about the weather in Tokyo?"
 
+    unappropriate_confirmation = process_event_request(unappropriate_user_input)
 
+    # Speculative mode: details are extracted while the gate check runs
+    for text in (appropriate_user_input, unappropriate_user_input):
+        metrics = ChainMetrics()
+        process_event_request(text, speculative=True, metrics=metrics)
+        print(f"Speculative run: {metrics.total_seconds:.2f}s total, {metrics.wasted_calls} wasted call(s), {metrics.wasted_seconds:.2f}s wasted")
 
+    # Many texts at once: the stages overlap across texts
+    calendar_emails = [
+        appropriate_user_input,
+        "Let's have a call with Ayse and Mehmet on Friday at 3pm for 30 minutes",
+        unappropriate_user_input,
+        "Team lunch next Tuesday at noon, about an hour",
+    ]
+    for text, result in zip(calendar_emails, asyncio.run(process_event_requests_pipelined(calendar_emails))):
+        print(f"\n{text}\n-> {result.confirmation_message if isinstance(result, EventConfirmation) else result}")
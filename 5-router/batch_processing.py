@@ -0,0 +1,154 @@
+"""
+Bulk processing of message files for ``todo_cli.py process-batch``.
+
+Messages are streamed from a JSONL or text file and processed a window at a
+time: the window is routed with the local pre-router stages plus batched
+model calls running in parallel, the messages are handled on a thread pool,
+and the results are appended to a JSONL output in input order.
+
+After every window the number of consumed input lines and the size of the
+output are written to a checkpoint file, so a crashed or interrupted run
+continues where it stopped with ``--resume``. Output written after the last
+checkpoint is discarded on resume and that window is processed again. Every
+fresh run gets a run id (kept in the checkpoint and reused on resume), and
+Task messages are added with the run id and line number as idempotency key,
+so tasks the crashed run already added are not added a second time while a
+new run over the same file adds its tasks normally.
+"""
+import json
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterator, Optional, TextIO, Tuple
+
+from message_input import parse_input_line
+from message_routing import ROUTING_BATCH_SIZE, handle_routed_message, pre_router, route_messages
+from todo_manager import TodoManager
+
+
+def read_messages(f: TextIO, skip_lines: int = 0) -> Iterator[Tuple[int, str, Any]]:
+    """Yield (line_number, message, id) for every non-blank line after the first ``skip_lines`` lines."""
+    for line_number, line in enumerate(f, start=1):
+        if line_number <= skip_lines:
+            continue
+        message, message_id = parse_input_line(line, line_number)
+        if message is not None:
+            yield line_number, message, message_id
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]):
+    """Write the checkpoint atomically (temporary file + rename)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def process_batch(input_path: str, output_path: str = "-", batch_size: int = ROUTING_BATCH_SIZE,
+                  workers: int = 4, checkpoint_path: Optional[str] = None, resume: bool = False,
+                  todo_manager: Optional[TodoManager] = None) -> Dict[str, Any]:
+    """
+    Route and handle every message of a file and write one JSON result line per message.
+
+    Parameters:
+        input_path (str): JSONL ({"id": ..., "message": "..."}) or text file, "-" for stdin.
+        output_path (str): JSONL results file, "-" for stdout.
+        batch_size (int): Messages per routing request to the model.
+        workers (int): Routing requests (and handler threads) running at the same time.
+        checkpoint_path (str): Progress file; defaults to ``<output>.checkpoint`` for file outputs.
+        resume (bool): Continue from the checkpoint instead of starting over.
+        todo_manager (TodoManager): Where Task messages are added.
+
+    Returns:
+        dict: The final checkpoint state (run_id, lines, processed, errors, routes).
+    """
+    if checkpoint_path is None and output_path != "-":
+        checkpoint_path = f"{output_path}.checkpoint"
+    todo_manager = todo_manager or TodoManager(lazy=True)
+    # A window is what one checkpoint covers: enough messages for every worker to route a batch
+    window_size = batch_size * workers
+
+    state = {"input": os.path.abspath(input_path), "run_id": uuid.uuid4().hex, "lines": 0, "output_bytes": 0,
+             "processed": 0, "errors": 0, "routes": {}}
+    if resume and checkpoint_path:
+        saved = load_checkpoint(checkpoint_path)
+        if saved is None:
+            print(f"No checkpoint at {checkpoint_path}, starting from the beginning", file=sys.stderr)
+        elif saved.get("input") != state["input"]:
+            raise ValueError(f"Checkpoint {checkpoint_path} belongs to {saved.get('input')}, not {input_path}")
+        else:
+            # Checkpoints written before run ids existed get a new one
+            state = {"run_id": state["run_id"], **saved}
+
+    if checkpoint_path and state["lines"] == 0:
+        # Record the run id before the first window, so a crash inside it resumes the same run
+        save_checkpoint(checkpoint_path, state)
+
+    input_file = sys.stdin if input_path == "-" else open(input_path, "r", encoding="utf-8")
+    if output_path == "-":
+        output_file = sys.stdout.buffer
+    else:
+        output_file = open(output_path, "r+b" if resume and os.path.exists(output_path) else "wb")
+        # Drop results written after the last checkpoint; their window is processed again
+        output_file.truncate(state["output_bytes"] if resume else 0)
+        output_file.seek(0, os.SEEK_END)
+
+    def route_pending(messages):
+        return [routed.result for routed in route_messages(messages, batch_size, max_workers=workers)]
+
+    def handle(line_number: int, message: str, route: str) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            # Keyed on the run and input line, so a window replayed after a crash does not add its tasks again
+            source = f"batch:{state['run_id']}:{line_number}"
+            return handle_routed_message(message, route, todo_manager, source=source), None
+        except Exception as e:
+            return None, str(e)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            messages = read_messages(input_file, skip_lines=state["lines"])
+            while True:
+                window = list(islice(messages, window_size))
+                if not window:
+                    break
+                texts = [message for _, message, _ in window]
+                # A routing failure stops the run; the checkpoint still points at this window
+                routes = pre_router.route_batch(texts, route_pending)
+                handled = list(executor.map(handle, [line_number for line_number, _, _ in window], texts, routes))
+
+                lines = []
+                for (line_number, message, message_id), route, (response, error) in zip(window, routes, handled):
+                    lines.append(json.dumps({
+                        "id": message_id, "line": line_number, "message": message,
+                        "route": route, "response": response, "error": error,
+                    }, ensure_ascii=False))
+                    state["routes"][route] = state["routes"].get(route, 0) + 1
+                    state["errors"] += error is not None
+                output_file.write(("\n".join(lines) + "\n").encode("utf-8"))
+                output_file.flush()
+
+                state["lines"] = window[-1][0]
+                state["processed"] += len(window)
+                if checkpoint_path:
+                    if output_path != "-":
+                        os.fsync(output_file.fileno())
+                        state["output_bytes"] = output_file.tell()
+                    save_checkpoint(checkpoint_path, state)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_path != "-":
+            output_file.close()
+    return state
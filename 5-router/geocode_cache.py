@@ -0,0 +1,177 @@
+"""
+Persistent geocoding cache for the weather service.
+
+City coordinates never change, so every geocoded location is stored in a
+SQLite file keyed on the normalized location string. Concurrent lookups for
+the same key are coalesced into one upstream request, and upstream requests
+are spaced out to respect Nominatim's 1 request/second policy. The cache can
+be warmed up from a CSV of known cities.
+"""
+import csv
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.single_flight import SingleFlight
+
+GeocodeResult = Optional[Dict[str, float]]
+
+# Locations Nominatim could not find are retried after this many seconds
+NEGATIVE_TTL_SECONDS = 24 * 60 * 60
+
+
+def normalize_location(location: str) -> str:
+    """Normalize a location string so that e.g. ' new  York?' and 'New York' share a key."""
+    location = re.sub(r"[^\w\s,-]", " ", location.casefold())
+    return re.sub(r"\s+", " ", location).strip(" ,")
+
+
+class GeocodeCache:
+    """
+    SQLite-backed geocode cache with request coalescing and rate limiting.
+
+    Parameters:
+        path (str): SQLite file; ":memory:" keeps the cache for this process only.
+        min_interval (float): Minimum number of seconds between upstream requests.
+    """
+
+    def __init__(self, path: str = "geocode_cache.sqlite3", min_interval: float = 1.0):
+        self.path = path
+        self.min_interval = min_interval
+        self.hits = 0
+        self.misses = 0
+        self._memory: Dict[str, GeocodeResult] = {}
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes ("
+            "key TEXT PRIMARY KEY, latitude REAL, longitude REAL, display_name TEXT, "
+            "found INTEGER NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._flight = SingleFlight()
+        self._rate_lock = threading.Lock()
+        self._last_request = 0.0
+
+    def get(self, location: str) -> GeocodeResult:
+        """Return the cached result for a location, or None if it is not cached (or not found)."""
+        found, result = self._lookup(normalize_location(location))
+        return result if found else None
+
+    def put(self, location: str, result: GeocodeResult):
+        """Store a geocoding result (None records that the location was not found)."""
+        self._store(normalize_location(location), result)
+
+    def lookup(self, location: str, fetch: Callable[[str], GeocodeResult]) -> GeocodeResult:
+        """
+        Return the coordinates of a location, calling ``fetch`` only on a cache miss.
+
+        Parameters:
+            location (str): Location name as typed by the user.
+            fetch: Upstream geocoder, called with the original location string.
+
+        Returns:
+            dict: latitude, longitude and display_name, or None if not found.
+        """
+        key = normalize_location(location)
+        found, result = self._lookup(key)
+        if found:
+            self.hits += 1
+            return result
+
+        def fetch_and_store() -> GeocodeResult:
+            # A call for this key may have finished between the check above and now
+            found, result = self._lookup(key)
+            if found:
+                return result
+            self.misses += 1
+            self._wait_for_rate_limit()
+            result = fetch(location)
+            self._store(key, result)
+            return result
+
+        # Concurrent lookups of the same key share one upstream request
+        return self._flight.do(key, fetch_and_store)
+
+    def warm_up_from_csv(self, csv_path: str) -> int:
+        """
+        Load known cities from a CSV file with ``name,latitude,longitude[,display_name]`` columns.
+
+        Returns:
+            int: Number of locations loaded.
+        """
+        count = 0
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            rows = [
+                (
+                    normalize_location(row["name"]),
+                    {
+                        "latitude": float(row["latitude"]),
+                        "longitude": float(row["longitude"]),
+                        "display_name": row.get("display_name") or row["name"],
+                    },
+                )
+                for row in csv.DictReader(f)
+            ]
+        now = time.time()
+        with self._db_lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, 1, ?)",
+                [
+                    (key, result["latitude"], result["longitude"], result["display_name"], now)
+                    for key, result in rows
+                ],
+            )
+            self._conn.commit()
+            for key, result in rows:
+                self._memory[key] = result
+                count += 1
+        return count
+
+    def _lookup(self, key: str):
+        """Return (found_in_cache, result)."""
+        if key in self._memory:
+            return True, self._memory[key]
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT latitude, longitude, display_name, found, fetched_at FROM geocodes WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return False, None
+        latitude, longitude, display_name, found, fetched_at = row
+        if not found:
+            if time.time() - fetched_at > NEGATIVE_TTL_SECONDS:
+                return False, None
+            return True, None
+        result = {"latitude": latitude, "longitude": longitude, "display_name": display_name}
+        self._memory[key] = result
+        return True, result
+
+    def _store(self, key: str, result: GeocodeResult):
+        with self._db_lock:
+            if result is None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO geocodes VALUES (?, NULL, NULL, NULL, 0, ?)",
+                    (key, time.time()),
+                )
+            else:
+                self._memory[key] = result
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, 1, ?)",
+                    (key, result["latitude"], result["longitude"], result["display_name"], time.time()),
+                )
+            self._conn.commit()
+
+    def _wait_for_rate_limit(self):
+        with self._rate_lock:
+            wait = self._last_request + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.monotonic()
@@ -0,0 +1,22 @@
+"""
+Parsing of message input lines shared by the router service and process-batch.
+
+A line is either a JSON object ({"id": ..., "message": "..."}) or plain text;
+plain-text lines are identified by their line number.
+"""
+import json
+from typing import Any, Optional, Tuple
+
+
+def parse_input_line(line: str, line_number: int) -> Tuple[Optional[str], Any]:
+    """Return (message, id) for a JSONL object or plain-text line; (None, None) for blank lines."""
+    line = line.strip()
+    if not line:
+        return None, None
+    if line.startswith("{"):
+        try:
+            data = json.loads(line)
+            return str(data["message"]), data.get("id", line_number)
+        except (ValueError, KeyError):
+            pass
+    return line, line_number
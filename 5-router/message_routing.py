@@ -1,18 +1,29 @@
-from google import genai
 import os
-from dotenv import load_dotenv
+import sys
+import json
+import asyncio
+from typing import List, Optional
 from pydantic import BaseModel, Field
 from enum import Enum
 from todo_manager import TodoManager
 from weather_service import is_weather_question, handle_weather_question
+from pre_router import PreRouter, RuleClassifier, TokenFrequencyClassifier
 
-# Load environment variables from .env file
-load_dotenv()
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.gemini_client import agenerate_structured, generate_content, generate_structured
+from shared.response_cache import get_default_cache, make_cache_key
+from shared.runtime import run_sync
 
-# Get API key from environment variable
-api_key = os.getenv("GOOGLE_AI_API_KEY")
-
-client = genai.Client(api_key=api_key)
+ROUTING_MODEL = "gemini-2.0-flash"
+# Maximum number of messages packed into a single batch routing request
+ROUTING_BATCH_SIZE = 50
+# Maximum number of batch routing requests sent at the same time
+ROUTING_BATCH_WORKERS = 4
+# JSONL file where LLM routing decisions are logged to train the local token model
+ROUTING_LOG_FILE = os.getenv(
+    "ROUTING_LOG_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_decisions.jsonl")
+)
 
 class RoutingResult(Enum):
     TASK = "Task"
@@ -25,25 +36,112 @@ class MessageForRouting(BaseModel):
     class Config:
         use_enum_values = True
 
+class RoutedMessage(BaseModel):
+    # routing result of one message in a batch, matched back by id
+    id: int = Field(description="The id of the message as given in the input")
+    result: RoutingResult = Field(description="The result of the routing, ['Task', 'Question', 'Information']")
+    class Config:
+        use_enum_values = True
+
+def build_routing_prompt(message: str) -> str:
+    """Build the prompt used to route a single message."""
+    return f"""
+    You are a helpful assistant that routes messages to the appropriate destination.
+    The possible destinations are:
+    - Task
+    - Question
+    - Information
+    The message is: {message}
+    """
+
 def route_message(message: str) -> MessageForRouting:
+    # Routing is a deterministic classification, so identical messages are served from the cache
+    return generate_structured(
+        model=ROUTING_MODEL,
+        contents=build_routing_prompt(message),
+        schema=MessageForRouting,
+        cache=get_default_cache()
+    )
+
+async def _aroute_batch(messages: List[str]) -> List[Optional[MessageForRouting]]:
+    """Route a chunk of messages with one model call. Missing ids are returned as None."""
+    numbered = "\n".join(
+        f"{i}: {json.dumps(message, ensure_ascii=False)}" for i, message in enumerate(messages)
+    )
     prompt = f"""
     You are a helpful assistant that routes messages to the appropriate destination.
     The possible destinations are:
     - Task
     - Question
     - Information
-    The message is: {message}
+    Route every message below independently. Each line is "<id>: <message>".
+    Return exactly one result per message with the same id.
+    Messages:
+    {numbered}
     """
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
+    routed = await agenerate_structured(
+        model=ROUTING_MODEL,
         contents=prompt,
-        config={
-        "response_mime_type": "application/json",
-            "response_schema": MessageForRouting
-        }
+        schema=list[RoutedMessage]
     )
-    return response.parsed
+    results: List[Optional[MessageForRouting]] = [None] * len(messages)
+    for item in routed or []:
+        if 0 <= item.id < len(messages) and results[item.id] is None:
+            results[item.id] = MessageForRouting(result=item.result)
+    return results
+
+async def _aroute_batches(chunks: List[List[str]], max_workers: int) -> List[List[Optional[MessageForRouting]]]:
+    """Route the chunks concurrently, at most ``max_workers`` requests at a time."""
+    slots = asyncio.Semaphore(max_workers)
+
+    async def route(chunk: List[str]):
+        async with slots:
+            return await _aroute_batch(chunk)
+
+    return await asyncio.gather(*(route(chunk) for chunk in chunks))
+
+def route_messages(messages: List[str], batch_size: int = ROUTING_BATCH_SIZE,
+                   max_workers: int = ROUTING_BATCH_WORKERS) -> List[MessageForRouting]:
+    """
+    Route many messages with as few model calls as possible.
+
+    Messages that were already routed are answered from the response cache,
+    duplicates are routed once, and the rest are packed into batch requests
+    of at most ``batch_size`` messages, at most ``max_workers`` of them at the
+    same time. Results are returned in input order.
+    Messages the model skips in a batch fall back to ``route_message``.
+    """
+    cache = get_default_cache()
+    results: List[Optional[MessageForRouting]] = [None] * len(messages)
+    keys = {}
+    pending: dict[str, List[int]] = {}
+
+    for index, message in enumerate(messages):
+        key = make_cache_key(ROUTING_MODEL, build_routing_prompt(message), MessageForRouting)
+        keys[message] = key
+        cached = cache.get(key, MessageForRouting)
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.setdefault(message, []).append(index)
+
+    unique = list(pending)
+    chunks = [unique[start:start + batch_size] for start in range(0, len(unique), batch_size)]
+    if chunks:
+        # The batch requests run on the shared runtime loop instead of a thread per chunk
+        chunk_results = run_sync(_aroute_batches(chunks, max_workers))
+
+        for chunk, routed in zip(chunks, chunk_results):
+            for message, result in zip(chunk, routed):
+                if result is None:
+                    result = route_message(message)
+                else:
+                    cache.set(keys[message], MessageForRouting, result)
+                for index in pending[message]:
+                    results[index] = result
+
+    return results
 
 def answer_question(question: str) -> str:
     """Use the LLM to answer a general question."""
@@ -52,31 +150,55 @@ def answer_question(question: str) -> str:
     {question}
     """
     
-    response = client.models.generate_content(
+    response = generate_content(
         model="gemini-2.0-pro-exp-02-05",
         contents=prompt
     )
     
     return response.text
 
-def process_message(message: str):
+# Obvious messages are routed locally; only ambiguous ones reach the LLM router
+pre_router = PreRouter(
+    stages=[
+        RuleClassifier.default(),
+        TokenFrequencyClassifier.from_log(ROUTING_LOG_FILE),
+    ],
+    fallback=lambda message: route_message(message).result,
+    decision_log=ROUTING_LOG_FILE,
+)
+
+def process_message(message: str, todo_manager: Optional[TodoManager] = None):
     """Process a message by routing it and handling it appropriately."""
     
-    # If not a weather question, proceed with normal routing
-    routing_result = route_message(message)
-    
-    if routing_result.result == "Task":
-        # If it's a task, add it to the to-do list
-        todo_manager = TodoManager()
-        todo_item = todo_manager.add_todo(message)
+    routing_result = MessageForRouting(result=pre_router.route(message))
+    return handle_routed_message(message, routing_result.result, todo_manager)
+
+def handle_routed_message(message: str, route: str, todo_manager: Optional[TodoManager] = None,
+                          source: Optional[str] = None) -> str:
+    """
+    Handle a message that has already been routed.
+
+    Parameters:
+        message (str): The message to handle.
+        route (str): "Task", "Question" or "Information".
+        todo_manager (TodoManager): Reused by long-running callers; a lazy one is opened if omitted.
+        source (str): Idempotency key for Task messages; a task with a known key is not added again.
+    """
+    if route == "Task":
+        # If it's a task, add it to the to-do list (lazy: the history is not replayed)
+        if todo_manager is None:
+            todo_manager = TodoManager(lazy=True)
+        todo_item = todo_manager.add_todo(message, source=source)
+        if todo_item is None:
+            return f"Already added to your to-do list earlier (since deleted): {message}"
         return f"Added to your to-do list: {todo_item.task} (ID: {todo_item.id})"
-    elif routing_result.result == "Question":
+    elif route == "Question":
         if is_weather_question(message):
             return handle_weather_question(message)
         else:
             # If it's a question, use the LLM to answer it
             return answer_question(message)
-    elif routing_result.result == "Information":
+    elif route == "Information":
         return "Thanks for the information: " + message
     else:
         return "I'm not sure how to handle this message."
@@ -92,6 +214,15 @@ if __name__ == "__main__":
     print(process_message("Create a proposal for a new product"))
     print("\nInformation example:")
     print(process_message("Tomorrow is your off day"))
+
+    print("\nBatch routing example:")
+    batch = ["Buy milk on the way home", "Who wrote Hamlet?", "The meeting moved to 3pm"]
+    for message, routing in zip(batch, route_messages(batch)):
+        print(f"{routing.result}: {message}")
+
+    print("\nPre-router stats:")
+    for stage, stats in pre_router.stats().items():
+        print(f"{stage}: {stats['hits']}/{stats['calls']} resolved, avg {stats['avg_latency_us']:.0f}us")
     
     # Show current to-do list
     todo_manager = TodoManager()
@@ -0,0 +1,278 @@
+"""
+Local fast-path routing that runs before the LLM router.
+
+A ``PreRouter`` runs a list of cheap local stages in order. The first stage
+that classifies a message confidently decides its route; only messages no
+stage is sure about are sent to the fallback (the LLM router). Every stage
+records how often it resolved a message and a latency histogram.
+
+Stages:
+    RuleClassifier: compiled keyword/regex rules for obvious messages.
+    TokenFrequencyClassifier: naive Bayes over word counts, trained from
+        logged LLM routing decisions.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from weather_service import is_weather_question
+
+TASK = "Task"
+QUESTION = "Question"
+INFORMATION = "Information"
+
+# Upper bounds (in microseconds) of the latency histogram buckets
+LATENCY_BUCKETS_US = (10, 100, 1_000, 10_000, 100_000, 1_000_000, math.inf)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9çğıöşü']+")
+
+
+def tokenize(message: str) -> List[str]:
+    """Split a message into lowercase word tokens."""
+    return _TOKEN_PATTERN.findall(message.lower())
+
+
+class RuleClassifier:
+    """Classify messages with compiled regex rules. The first matching rule wins."""
+
+    name = "rules"
+
+    def __init__(self, rules: Iterable[Tuple[str, str]]):
+        self.rules = [(re.compile(pattern, re.IGNORECASE), result) for pattern, result in rules]
+
+    @classmethod
+    def default(cls) -> "RuleClassifier":
+        """Rules for messages whose route is obvious from their shape."""
+        return cls([
+            # Direct questions
+            (r"^\s*(what|who|whom|whose|when|where|why|which|how)\b.*\?\s*$", QUESTION),
+            (r"^\s*(is|are|was|were|do|does|did)\b.*\?\s*$", QUESTION),
+            # Imperative requests and reminders
+            (r"^\s*(please\s+)?(add|buy|create|send|write|prepare|submit|pick\s+up)\s+\w(?!.*\?\s*$)", TASK),
+            # Words that are also nouns ("Update: ...", "Review of Q3 ...", "Order #123 ...")
+            # only count as imperatives when an object follows
+            (r"^\s*(please\s+)?(call|email|review|update|order|book|schedule|pay|clean|fix|finish)\s+"
+             r"(the|a|an|my|our|your|his|her|their|this|that|these|those|me|him|them|us|it|all)\b(?!.*\?\s*$)", TASK),
+            (r"^\s*(remind\s+me|remember\s+to|don'?t\s+forget|todo:|to-do:|to\s+do:)", TASK),
+            # Statements that only share information
+            (r"^\s*(fyi|note\s+that|just\s+so\s+you\s+know|for\s+your\s+information)\b(?!.*\?\s*$)", INFORMATION),
+        ])
+
+    def classify(self, message: str) -> Optional[str]:
+        # Weather questions are answered locally, no need to ask the LLM router
+        if message.rstrip().endswith("?") and is_weather_question(message):
+            return QUESTION
+        for pattern, result in self.rules:
+            if pattern.search(message):
+                return result
+        return None
+
+
+class TokenFrequencyClassifier:
+    """
+    Multinomial naive Bayes classifier over word counts.
+
+    It only answers when the posterior probability of the best route is at
+    least ``min_confidence`` and it has seen at least ``min_examples``
+    training messages; otherwise the message is passed on.
+    """
+
+    name = "token_model"
+
+    def __init__(self, min_confidence: float = 0.95, min_examples: int = 50):
+        self.min_confidence = min_confidence
+        self.min_examples = min_examples
+        self.token_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.token_totals: Counter = Counter()
+        self.label_counts: Counter = Counter()
+        self.vocabulary: set = set()
+        # Lines of the training log that could not be used
+        self.skipped_log_lines = 0
+
+    @property
+    def example_count(self) -> int:
+        return sum(self.label_counts.values())
+
+    def train(self, examples: Iterable[Tuple[str, str]]):
+        """Add (message, route) examples to the model."""
+        for message, label in examples:
+            tokens = tokenize(message)
+            self.label_counts[label] += 1
+            self.token_counts[label].update(tokens)
+            self.token_totals[label] += len(tokens)
+            self.vocabulary.update(tokens)
+
+    @classmethod
+    def from_log(cls, log_file: str, **kwargs) -> "TokenFrequencyClassifier":
+        """Train a model from a JSONL file of logged routing decisions."""
+        model = cls(**kwargs)
+        if os.path.exists(log_file):
+            with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+                model.train(model._read_log(f))
+            if model.skipped_log_lines:
+                print(f"Skipped {model.skipped_log_lines} unreadable lines in {log_file}")
+        return model
+
+    def _read_log(self, lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        """Yield (message, route) pairs; truncated or malformed lines are skipped and counted."""
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                message, label = record["message"], record["result"]
+            except (ValueError, TypeError, KeyError):
+                self.skipped_log_lines += 1
+                continue
+            if not isinstance(message, str) or not isinstance(label, str):
+                self.skipped_log_lines += 1
+                continue
+            yield message, label
+
+    def predict_proba(self, message: str) -> Dict[str, float]:
+        """Return the posterior probability of every known route."""
+        tokens = tokenize(message)
+        vocabulary_size = len(self.vocabulary) + 1
+        total = self.example_count
+        scores = {}
+        for label, label_count in self.label_counts.items():
+            counts = self.token_counts[label]
+            denominator = self.token_totals[label] + vocabulary_size
+            score = math.log(label_count / total)
+            for token in tokens:
+                score += math.log((counts[token] + 1) / denominator)
+            scores[label] = score
+        if not scores:
+            return {}
+        best = max(scores.values())
+        exp_scores = {label: math.exp(score - best) for label, score in scores.items()}
+        norm = sum(exp_scores.values())
+        return {label: value / norm for label, value in exp_scores.items()}
+
+    def classify(self, message: str) -> Optional[str]:
+        if self.example_count < self.min_examples:
+            return None
+        probabilities = self.predict_proba(message)
+        if not probabilities:
+            return None
+        label, probability = max(probabilities.items(), key=lambda item: item[1])
+        return label if probability >= self.min_confidence else None
+
+
+class StageStats:
+    """Hit counter and latency histogram of one routing stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.hits = 0
+        self.total_seconds = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS_US)
+
+    def record(self, seconds: float, hit: bool):
+        self.calls += 1
+        self.hits += int(hit)
+        self.total_seconds += seconds
+        micros = seconds * 1_000_000
+        for i, bound in enumerate(LATENCY_BUCKETS_US):
+            if micros <= bound:
+                self.histogram[i] += 1
+                break
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / self.calls if self.calls else 0.0
+
+    def as_dict(self) -> dict:
+        labels = [f"<={bound}us" if bound != math.inf else "inf" for bound in LATENCY_BUCKETS_US]
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "hit_ratio": self.hit_ratio,
+            "avg_latency_us": self.total_seconds / self.calls * 1_000_000 if self.calls else 0.0,
+            "latency_histogram": dict(zip(labels, self.histogram)),
+        }
+
+
+class PreRouter:
+    """
+    Run local stages before falling back to the (slow) LLM router.
+
+    Parameters:
+        stages: Objects with a ``name`` and a ``classify(message)`` method
+            that returns a route or None when unsure.
+        fallback: Called with the message when no stage is sure; returns a route.
+        decision_log: Optional JSONL file where fallback decisions are
+            appended, to train a ``TokenFrequencyClassifier`` later.
+    """
+
+    def __init__(self, stages: List, fallback: Callable[[str], str], decision_log: Optional[str] = None):
+        self.stages = list(stages)
+        self.fallback = fallback
+        self.decision_log = decision_log
+        self._lock = threading.Lock()
+        self._stats = {stage.name: StageStats(stage.name) for stage in self.stages}
+        self._stats["llm"] = StageStats("llm")
+
+    def route(self, message: str) -> str:
+        """Return the route of a message, using the first stage that is sure."""
+        result = self._classify_locally(message)
+        if result is not None:
+            return result
+
+        start = time.perf_counter()
+        result = self.fallback(message)
+        self._record("llm", time.perf_counter() - start, True)
+        if self.decision_log:
+            self._log_decisions([(message, result)])
+        return result
+
+    def route_batch(self, messages: List[str], fallback_batch: Callable[[List[str]], List[str]]) -> List[str]:
+        """
+        Route many messages: every message goes through the local stages, and
+        the ones no stage is sure about are passed to ``fallback_batch`` in a
+        single call (e.g. a batched LLM router). Results are in input order.
+        """
+        results = [self._classify_locally(message) for message in messages]
+        unresolved = [index for index, result in enumerate(results) if result is None]
+        if not unresolved:
+            return results
+
+        start = time.perf_counter()
+        routed = fallback_batch([messages[index] for index in unresolved])
+        per_message = (time.perf_counter() - start) / len(unresolved)
+        for index, result in zip(unresolved, routed):
+            results[index] = result
+            self._record("llm", per_message, True)
+        if self.decision_log:
+            self._log_decisions([(messages[index], results[index]) for index in unresolved])
+        return results
+
+    def _classify_locally(self, message: str) -> Optional[str]:
+        for stage in self.stages:
+            start = time.perf_counter()
+            result = stage.classify(message)
+            self._record(stage.name, time.perf_counter() - start, result is not None)
+            if result is not None:
+                return result
+        return None
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-stage hit ratio and latency histogram."""
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def _record(self, name: str, seconds: float, hit: bool):
+        with self._lock:
+            self._stats[name].record(seconds, hit)
+
+    def _log_decisions(self, decisions: List[Tuple[str, str]]):
+        with self._lock:
+            with open(self.decision_log, "a", encoding="utf-8") as f:
+                for message, result in decisions:
+                    f.write(json.dumps({"message": message, "result": result}, ensure_ascii=False) + "\n")
@@ -0,0 +1,260 @@
+"""
+Long-running message-processing service for the router.
+
+Imports, model-client construction, the geocode cache and the to-do log are
+set up once, and then a stream of messages is processed by one process:
+
+    python router_server.py --stdin < messages.jsonl
+    python router_server.py --http 127.0.0.1:8080
+
+stdin lines are either JSON objects ({"id": ..., "message": "..."}) or plain
+text; one JSON result per message is written to stdout as it completes. The
+HTTP interface accepts POST /messages with {"message": "..."} or
+{"messages": [...]} and serves GET /stats and GET /health.
+
+Messages are admitted with bounded concurrency (so a fast producer cannot
+queue unbounded work) and routed and handled on a thread pool, since the
+routing, weather and model calls are blocking.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from message_input import parse_input_line
+from message_routing import handle_routed_message, pre_router
+from todo_manager import TodoManager
+
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.gemini_client import get_client
+
+# Messages being processed at the same time (admission limit)
+MAX_CONCURRENCY = int(os.getenv("ROUTER_MAX_CONCURRENCY", "32"))
+# Threads running the blocking routing and handler code
+WORKERS = int(os.getenv("ROUTER_WORKERS", "8"))
+# Largest HTTP request body accepted
+MAX_BODY_BYTES = 1024 * 1024
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large"}
+
+
+class RouterServer:
+    """
+    Processes messages with warm state shared across requests.
+
+    Parameters:
+        max_concurrency (int): Maximum number of messages in flight.
+        workers (int): Size of the thread pool running routing and handlers.
+        todo_file (str): To-do log that Task messages are added to.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, workers: int = WORKERS,
+                 todo_file: str = "todos.jsonl"):
+        self.max_concurrency = max_concurrency
+        self.todo_manager = TodoManager(todo_file, lazy=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="router-worker")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.processed = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_latency = 0.0
+        self.started_at = time.time()
+
+    def warm_up(self):
+        """Build the model client up front so the first message does not pay for it."""
+        try:
+            get_client()
+        except Exception as e:
+            print(f"Model client not available: {e}", file=sys.stderr)
+
+    def _handle(self, message: str) -> Tuple[str, str]:
+        route = pre_router.route(message)
+        return route, handle_routed_message(message, route, self.todo_manager)
+
+    async def process(self, message: str, message_id: Any = None) -> Dict[str, Any]:
+        """Route and handle one message on the worker pool."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await self._run(message, message_id)
+
+    async def _run(self, message: str, message_id: Any) -> Dict[str, Any]:
+        result = {"id": message_id, "message": message, "route": None, "response": None, "error": None}
+        start = time.perf_counter()
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result["route"], result["response"] = await loop.run_in_executor(self._executor, self._handle, message)
+        except Exception as e:
+            self.errors += 1
+            result["error"] = str(e)
+        finally:
+            self.in_flight -= 1
+            elapsed = time.perf_counter() - start
+            self.processed += 1
+            self.total_latency += elapsed
+            result["latency_ms"] = round(elapsed * 1000, 1)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_latency_ms": round(self.total_latency / self.processed * 1000, 1) if self.processed else 0.0,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "pre_router": pre_router.stats(),
+        }
+
+    async def serve_stdin(self, output=None):
+        """Read messages from stdin until EOF and write one JSON result line per message."""
+        output = output or sys.stdout
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        pending = set()
+
+        async def process_and_write(message: str, message_id: Any):
+            try:
+                result = await self._run(message, message_id)
+            finally:
+                self._semaphore.release()
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+
+        line_number = 0
+        while True:
+            # Reading waits for a free slot, so input is consumed only as fast as it is processed
+            await self._semaphore.acquire()
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                self._semaphore.release()
+                break
+            line_number += 1
+            message, message_id = parse_input_line(line, line_number)
+            if message is None:
+                self._semaphore.release()
+                continue
+            task = asyncio.create_task(process_and_write(message, message_id))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def serve_http(self, host: str, port: int):
+        """Serve the HTTP interface until cancelled."""
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Router server listening on http://{host}:{port}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Minimal HTTP/1.1 handling with keep-alive."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Malformed request line"}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length_header = headers.get("content-length") or "0"
+                if not length_header.isdigit():
+                    # The body cannot be framed, so the connection cannot be reused
+                    await self._respond(writer, 400, {"error": "Invalid Content-Length"}, keep_alive=False)
+                    break
+                length = int(length_header)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self._dispatch(method, path.split("?", 1)[0], body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/stats":
+            return 200, self.stats()
+        if method == "POST" and path == "/messages":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                return 400, {"error": "Body must be JSON"}
+            if not isinstance(request, dict):
+                return 400, {"error": "Body must be a JSON object"}
+            if isinstance(request.get("message"), str):
+                return 200, await self.process(request["message"], request.get("id"))
+            if isinstance(request.get("messages"), list):
+                results = await asyncio.gather(
+                    *(self.process(str(message), index) for index, message in enumerate(request["messages"]))
+                )
+                return 200, {"results": results}
+            return 400, {"error": 'Expected {"message": "..."} or {"messages": [...]}'}
+        return 404, {"error": f"No route for {method} {path}"}
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running router service")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--stdin", action="store_true", help="Read JSONL or text messages from stdin")
+    group.add_argument("--http", metavar="HOST:PORT", help="Serve the HTTP interface")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY, help="Messages in flight")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker threads")
+    parser.add_argument("--todo-file", default="todos.jsonl", help="To-do log for Task messages")
+    args = parser.parse_args()
+
+    server = RouterServer(args.max_concurrency, args.workers, args.todo_file)
+    server.warm_up()
+    try:
+        if args.stdin:
+            asyncio.run(server.serve_stdin())
+        else:
+            host, _, port = args.http.rpartition(":")
+            asyncio.run(server.serve_http(host or "127.0.0.1", int(port)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        print(json.dumps(server.stats()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,25 @@
-from message_routing import process_message
+from message_routing import process_message, ROUTING_BATCH_SIZE
+from batch_processing import process_batch
 from todo_manager import TodoManager
-from weather_service import handle_weather_question
+from weather_service import handle_weather_question, get_weather_for_locations, format_weather_response
 import argparse
+import json
+import sys
+from itertools import islice
 
 def display_todos(todos):
-    """Display a list of todos in a formatted way."""
-    if not todos:
-        print("No items in the to-do list.")
-        return
-    
+    """Display a list (or iterator) of todos in a formatted way."""
+    shown = 0
     for todo in todos:
         status = "✓" if todo.completed else "□"
         created = todo.created_at.strftime("%Y-%m-%d %H:%M")
         completed = todo.completed_at.strftime("%Y-%m-%d %H:%M") if todo.completed_at else "N/A"
         print(f"{todo.id}. [{status}] {todo.task}")
         print(f"   Created: {created} | Completed: {completed}")
+        shown += 1
+    
+    if not shown:
+        print("No items in the to-do list.")
 
 def main():
     parser = argparse.ArgumentParser(description="Smart Assistant with To-Do List and Weather")
@@ -36,21 +41,34 @@ def main():
     list_parser = subparsers.add_parser("list", help="List tasks")
     list_parser.add_argument("--all", action="store_true", help="Show all tasks")
     list_parser.add_argument("--completed", action="store_true", help="Show only completed tasks")
+    list_parser.add_argument("--limit", type=int, default=None, help="Show at most this many tasks")
     
     # Process a message (auto-route)
     process_parser = subparsers.add_parser("process", help="Process a message and route it")
     process_parser.add_argument("message", help="Message to process")
     
+    # Process a file of messages
+    batch_parser = subparsers.add_parser("process-batch", help="Route and handle a JSONL or text file of messages")
+    batch_parser.add_argument("input", help='File with one message per line (text or {"id": ..., "message": "..."}), - for stdin')
+    batch_parser.add_argument("-o", "--output", default="-", help="JSONL file for the results (default: stdout)")
+    batch_parser.add_argument("--batch-size", type=int, default=ROUTING_BATCH_SIZE, help="Messages per routing request")
+    batch_parser.add_argument("--workers", type=int, default=4, help="Routing requests and handlers running in parallel")
+    batch_parser.add_argument("--checkpoint", default=None, help="Progress file (default: <output>.checkpoint)")
+    batch_parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its checkpoint")
+    
     # Weather command
     weather_parser = subparsers.add_parser("weather", help="Get weather information")
-    weather_parser.add_argument("location", help="Location to get weather for")
+    weather_parser.add_argument(
+        "location", nargs="+", help='Location to get weather for; separate several with commas ("New York, Paris")'
+    )
     
     # Ask command (direct question to LLM)
     ask_parser = subparsers.add_parser("ask", help="Ask a question directly")
     ask_parser.add_argument("question", help="Question to ask")
     
     args = parser.parse_args()
-    todo_manager = TodoManager()
+    # Lazy: "add" only appends, other commands replay the log when they need it
+    todo_manager = TodoManager(lazy=True)
     
     if args.command == "add":
         todo = todo_manager.add_todo(args.task)
@@ -71,24 +89,45 @@ def main():
             print(f"No task found with ID {args.id}")
     
     elif args.command == "list":
+        # Counts run over the columnar store; TodoItems are only built for the shown rows
         if args.completed:
-            print("Completed Tasks:")
-            display_todos(todo_manager.get_completed_todos())
+            print(f"Completed Tasks ({todo_manager.count_todos(completed=True)}):")
+            display_todos(islice(todo_manager.iter_completed_todos(), args.limit))
         elif args.all:
-            print("All Tasks:")
-            display_todos(todo_manager.get_all_todos())
+            print(f"All Tasks ({todo_manager.count_todos()}):")
+            display_todos(islice(todo_manager.iter_todos(), args.limit))
         else:
-            print("Active Tasks:")
-            display_todos(todo_manager.get_active_todos())
+            print(f"Active Tasks ({todo_manager.count_todos(completed=False)}):")
+            display_todos(islice(todo_manager.iter_active_todos(), args.limit))
     
     elif args.command == "process":
         result = process_message(args.message)
         print(result)
     
+    elif args.command == "process-batch":
+        state = process_batch(
+            args.input, args.output, batch_size=args.batch_size, workers=args.workers,
+            checkpoint_path=args.checkpoint, resume=args.resume, todo_manager=todo_manager,
+        )
+        # Summary goes to stderr so it does not mix with JSONL results on stdout
+        print(f"Processed {state['processed']} messages ({state['errors']} errors): "
+              f"{json.dumps(state['routes'])}", file=sys.stderr)
+    
     elif args.command == "weather":
-        weather_question = f"What is the weather in {args.location}?"
-        result = handle_weather_question(weather_question)
-        print(result)
+        # Words are joined so unquoted multi-word names work; commas separate locations
+        locations = [part.strip() for part in " ".join(args.location).split(",") if part.strip()]
+        if len(locations) == 1:
+            weather_question = f"What is the weather in {locations[0]}?"
+            result = handle_weather_question(weather_question)
+            print(result)
+        else:
+            # Several locations are geocoded concurrently and fetched in bulk
+            for item in get_weather_for_locations(locations):
+                if item["weather"]:
+                    print(format_weather_response(item["weather"]))
+                else:
+                    print(f"{item['location']}: {item['error']}")
+                print()
     
     elif args.command == "ask":
         result = process_message(args.question)
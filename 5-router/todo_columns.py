@@ -0,0 +1,169 @@
+"""
+Columnar in-memory representation of the to-do list used by ``TodoManager``.
+
+Instead of one dict or Pydantic object per item, every field is kept in a
+parallel array indexed by row:
+
+    ids        array('q')   item id, in ascending order
+    status     bytearray    DELETED / ACTIVE / COMPLETED
+    created    array('q')   created_at as microseconds since 1970-01-01
+    completed  array('q')   completed_at as microseconds, or NO_TIME
+    task_refs  array('L')   index into the interned task-string table
+
+A row costs about 30 bytes plus its task string, which is shared between
+items with the same text. Counting and filtering by status are
+bytearray.count/find calls that run in C, lookups by id are a binary search
+over ``ids``, and datetimes are only rebuilt for the rows that are read.
+"""
+import bisect
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+DELETED = 0
+ACTIVE = 1
+COMPLETED = 2
+
+# Stored in the completed column for items that are not completed
+NO_TIME = -(2 ** 63)
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+Timestamp = Union[datetime, str, None]
+
+
+def to_micros(value: Timestamp) -> int:
+    """Convert a datetime (or its ISO string) to microseconds since the epoch."""
+    if value is None:
+        return NO_TIME
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_micros(value: int) -> Optional[datetime]:
+    """Inverse of ``to_micros``."""
+    if value == NO_TIME:
+        return None
+    return _EPOCH + timedelta(microseconds=value)
+
+
+class TodoColumns:
+    """Parallel-array store of to-do items."""
+
+    def __init__(self):
+        self.ids = array("q")
+        self.status = bytearray()
+        self.created = array("q")
+        self.completed = array("q")
+        self.task_refs = array("L")
+        self.tasks: List[str] = []
+        self._task_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        """Number of live (not deleted) items."""
+        return len(self.status) - self.status.count(DELETED)
+
+    def _intern(self, task: str) -> int:
+        ref = self._task_index.get(task)
+        if ref is None:
+            ref = len(self.tasks)
+            self.tasks.append(task)
+            self._task_index[task] = ref
+        return ref
+
+    def add(self, todo_id: int, task: str, created_at: Timestamp,
+            completed: bool = False, completed_at: Timestamp = None) -> int:
+        """
+        Add an item and return its row.
+
+        Ids are handed out in increasing order, so this is normally an append;
+        an out-of-order id is inserted at its sorted position and an existing
+        id is overwritten.
+        """
+        values = (
+            COMPLETED if completed else ACTIVE,
+            to_micros(created_at),
+            to_micros(completed_at),
+            self._intern(task),
+        )
+        row = len(self.ids)
+        if row and self.ids[-1] >= todo_id:
+            row = bisect.bisect_left(self.ids, todo_id)
+            if self.ids[row] == todo_id:
+                self.status[row], self.created[row], self.completed[row], self.task_refs[row] = values
+                return row
+            self.ids.insert(row, todo_id)
+            self.status.insert(row, values[0])
+            self.created.insert(row, values[1])
+            self.completed.insert(row, values[2])
+            self.task_refs.insert(row, values[3])
+            return row
+        self.ids.append(todo_id)
+        self.status.append(values[0])
+        self.created.append(values[1])
+        self.completed.append(values[2])
+        self.task_refs.append(values[3])
+        return row
+
+    def row_of(self, todo_id: int) -> Optional[int]:
+        """Row of a live item, or None."""
+        row = bisect.bisect_left(self.ids, todo_id)
+        if row < len(self.ids) and self.ids[row] == todo_id and self.status[row] != DELETED:
+            return row
+        return None
+
+    def complete(self, row: int, completed_at: Timestamp):
+        self.status[row] = COMPLETED
+        self.completed[row] = to_micros(completed_at)
+
+    def delete(self, row: int):
+        self.status[row] = DELETED
+
+    def count(self, completed: Optional[bool] = None) -> int:
+        """Count live items, optionally only active (False) or completed (True) ones."""
+        if completed is None:
+            return len(self)
+        return self.status.count(COMPLETED if completed else ACTIVE)
+
+    def rows(self, completed: Optional[bool] = None) -> Iterator[int]:
+        """Yield the rows of live items in id order, optionally filtered by completion."""
+        if completed is None:
+            for row, status in enumerate(self.status):
+                if status != DELETED:
+                    yield row
+            return
+        wanted = COMPLETED if completed else ACTIVE
+        row = self.status.find(wanted)
+        while row != -1:
+            yield row
+            row = self.status.find(wanted, row + 1)
+
+    def fields(self, row: int) -> Dict[str, Any]:
+        """The TodoItem fields of a row."""
+        return {
+            "id": self.ids[row],
+            "task": self.tasks[self.task_refs[row]],
+            "created_at": from_micros(self.created[row]),
+            "completed": self.status[row] == COMPLETED,
+            "completed_at": from_micros(self.completed[row]),
+        }
+
+    def compacted(self) -> "TodoColumns":
+        """
+        Return a copy without deleted rows and unused task strings.
+
+        A new store is returned (rather than compacting in place) so that
+        iterators over the old one keep valid row numbers.
+        """
+        compacted = TodoColumns()
+        for row in self.rows():
+            compacted.ids.append(self.ids[row])
+            compacted.status.append(self.status[row])
+            compacted.created.append(self.created[row])
+            compacted.completed.append(self.completed[row])
+            compacted.task_refs.append(compacted._intern(self.tasks[self.task_refs[row]]))
+        return compacted
@@ -1,8 +1,10 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 from pydantic import BaseModel, Field
-import json
 import os
+import threading
+from todo_store import LogReplaced, TodoLog, read_legacy_json
+from todo_columns import TodoColumns
 
 class TodoItem(BaseModel):
     id: int
@@ -17,79 +19,271 @@ class TodoItem(BaseModel):
         }
 
 class TodoManager:
-    def __init__(self, storage_file: str = "todos.json"):
+    """
+    To-do list stored in an append-only operation log (see todo_store.py).
+
+    The log is replayed into a columnar store (see todo_columns.py), and
+    TodoItem objects are only built for the items that are actually read.
+    The next id is stored, so every add/complete/delete is an array update
+    plus one appended line. The log is compacted once it holds much more
+    records than there are live items.
+
+    With ``lazy=True`` nothing is replayed at construction: the next id is
+    read from the tail of the memory-mapped log, so a process that only adds
+    tasks starts instantly. The log is replayed on the first call that needs
+    the existing items.
+
+    Several processes (and threads) can use the same file. Every change is
+    made under the log's inter-process lock after applying the records other
+    writers appended, so ids are never handed out twice and no change is
+    lost. Reads pick up other writers' changes when the file has changed.
+
+    An add can carry a ``source`` key (e.g. input file and line of a batch
+    run). A second add with the same key returns the first item instead of
+    adding a duplicate, so replaying work after a crash is safe.
+    """
+
+    # Compact when the log has more than COMPACT_RATIO records per live item
+    COMPACT_RATIO = 2
+    # ...but never for small logs
+    COMPACT_MIN_RECORDS = 1000
+
+    def __init__(self, storage_file: str = "todos.jsonl", lazy: bool = False):
         self.storage_file = storage_file
-        self.todos: List[TodoItem] = []
-        self.load_todos()
+        self.log = TodoLog(storage_file)
+        self._columns = TodoColumns()
+        # source key -> id of the item added for it
+        self._sources: Dict[str, int] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+        self.next_id = 1
+        if lazy and self.log.exists() and not self.log.is_legacy_format():
+            self.next_id = self.log.read_next_id()
+        else:
+            self.load_todos()
     
     def load_todos(self):
-        """Load todos from the storage file if it exists."""
-        if os.path.exists(self.storage_file):
+        """Load todos by replaying the operation log (or importing an old todos.json)."""
+        with self._lock:
+            self._columns = TodoColumns()
+            self._sources = {}
+            self.next_id = 1
+            self._loaded = True
             try:
-                with open(self.storage_file, "r") as f:
-                    todos_data = json.load(f)
-                    self.todos = []
-                    for todo_data in todos_data:
-                        # Convert string dates back to datetime objects
-                        if "created_at" in todo_data and todo_data["created_at"]:
-                            todo_data["created_at"] = datetime.fromisoformat(todo_data["created_at"])
-                        if "completed_at" in todo_data and todo_data["completed_at"]:
-                            todo_data["completed_at"] = datetime.fromisoformat(todo_data["completed_at"])
-                        self.todos.append(TodoItem(**todo_data))
+                if self._legacy_source():
+                    with self.log.locked():
+                        # Another process may have converted it in the meantime
+                        legacy_source = self._legacy_source()
+                        if legacy_source:
+                            self._import_legacy(legacy_source)
+                            return
+                for record in self.log.read_records():
+                    self._apply(record)
             except Exception as e:
                 print(f"Error loading todos: {e}")
-                self.todos = []
+                self._columns = TodoColumns()
+    
+    def _legacy_source(self) -> Optional[str]:
+        """Path of an old-style JSON-array file to import, if any."""
+        if self.log.is_legacy_format():
+            return self.storage_file
+        legacy_file = os.path.splitext(self.storage_file)[0] + ".json"
+        if not self.log.exists() and legacy_file != self.storage_file and os.path.exists(legacy_file):
+            return legacy_file
+        return None
+    
+    def _refresh(self):
+        """Load the log on first use, then apply what other processes wrote since the last read."""
+        if not self._loaded:
+            self.load_todos()
+        elif self.log.changed():
+            try:
+                for record in self.log.read_new_records():
+                    self._apply(record)
+            except LogReplaced:
+                # Compacted by another process: the new file holds the full state
+                self.load_todos()
+    
+    def _sync_for_write(self):
+        """Bring the id counter (and the items, if loaded) up to date. Call with the log locked."""
+        if self._loaded:
+            self._refresh()
+        else:
+            self.next_id = max(self.next_id, self.log.read_next_id())
+    
+    def _apply(self, record: Dict[str, Any]):
+        """Apply one log record to the in-memory index."""
+        op = record.get("op")
+        if op == "header":
+            self.next_id = max(self.next_id, record["next_id"])
+        elif op == "add":
+            self._columns.add(
+                record["id"], record["task"], record["created_at"],
+                record.get("completed", False), record.get("completed_at"),
+            )
+            self.next_id = max(self.next_id, record["id"] + 1)
+            if record.get("source") is not None:
+                self._sources[record["source"]] = record["id"]
+        elif op == "complete":
+            row = self._columns.row_of(record["id"])
+            if row is not None:
+                self._columns.complete(row, record["completed_at"])
+        elif op == "delete":
+            row = self._columns.row_of(record["id"])
+            if row is not None:
+                self._columns.delete(row)
+    
+    def _import_legacy(self, path: str):
+        """Convert a todos file in the old JSON-array format to the log format (with the log locked)."""
+        for todo_data in read_legacy_json(path):
+            todo = TodoItem(**todo_data)
+            self._columns.add(todo.id, todo.task, todo.created_at, todo.completed, todo.completed_at)
+            self.next_id = max(self.next_id, todo.id + 1)
+        self.log.rewrite(self._snapshot_records())
+    
+    def _item(self, row: int) -> TodoItem:
+        """Build the TodoItem for a row of the columnar store."""
+        return TodoItem(**self._columns.fields(row))
+    
+    def _snapshot_records(self) -> Iterator[Dict[str, Any]]:
+        yield {"op": "header", "next_id": self.next_id}
+        source_of = {todo_id: source for source, todo_id in self._sources.items()}
+        for row in self._columns.rows():
+            record = {"op": "add", **self._columns.fields(row)}
+            if record["id"] in source_of:
+                record["source"] = source_of[record["id"]]
+            yield record
     
     def save_todos(self):
-        """Save todos to the storage file."""
+        """Compact: rewrite the log as a header plus one record per live item."""
+        with self._lock, self.log.locked():
+            self._refresh()
+            try:
+                self.log.rewrite(self._snapshot_records())
+            except Exception as e:
+                print(f"Error saving todos: {e}")
+                return
+            self._columns = self._columns.compacted()
+            # Source keys of deleted items are not in the compacted log either
+            self._sources = {
+                source: todo_id for source, todo_id in self._sources.items()
+                if self._columns.row_of(todo_id) is not None
+            }
+    
+    def _append(self, record: Dict[str, Any]):
+        """Append a record. Call with the log locked, after _sync_for_write."""
         try:
-            with open(self.storage_file, "w") as f:
-                todos_json = [todo.dict() for todo in self.todos]
-                json.dump(todos_json, f, default=str, indent=2)
+            self.log.append(record)
         except Exception as e:
             print(f"Error saving todos: {e}")
+            return
+        # The number of live items is only known once the log has been replayed
+        if self._loaded and self.log.record_count > max(self.COMPACT_MIN_RECORDS, self.COMPACT_RATIO * len(self._columns)):
+            self.save_todos()
     
-    def add_todo(self, task: str) -> TodoItem:
-        """Add a new todo item."""
-        # Generate a new ID (simple increment)
-        new_id = 1 if not self.todos else max(todo.id for todo in self.todos) + 1
-        
-        # Create new todo item
-        todo = TodoItem(id=new_id, task=task)
-        self.todos.append(todo)
-        self.save_todos()
+    def add_todo(self, task: str, source: Optional[str] = None) -> Optional[TodoItem]:
+        """
+        Add a new todo item.
+
+        Parameters:
+            task (str): The task text.
+            source (str): Optional idempotency key. If an item was already added
+                with this key, nothing is added and that item is returned (None
+                if it has been deleted since). Checking the key replays the log
+                in lazy mode.
+
+        Returns:
+            TodoItem: The new item, or the one added earlier for ``source``.
+        """
+        with self._lock, self.log.locked():
+            # Ids other processes handed out are seen before the next one is taken
+            if source is not None:
+                self._refresh()
+                if source in self._sources:
+                    row = self._columns.row_of(self._sources[source])
+                    return self._item(row) if row is not None else None
+            else:
+                self._sync_for_write()
+            new_id = self.next_id
+            self.next_id += 1
+            
+            # Create new todo item
+            todo = TodoItem(id=new_id, task=task)
+            record = {"op": "add", **todo.dict()}
+            if source is not None:
+                record["source"] = source
+                self._sources[source] = new_id
+            # In lazy mode the record is picked up when the log is replayed
+            if self._loaded:
+                self._columns.add(todo.id, todo.task, todo.created_at)
+            self._append(record)
         return todo
     
     def complete_todo(self, todo_id: int) -> Optional[TodoItem]:
         """Mark a todo as completed."""
-        for todo in self.todos:
-            if todo.id == todo_id:
-                todo.completed = True
-                todo.completed_at = datetime.now()
-                self.save_todos()
-                return todo
-        return None
+        with self._lock, self.log.locked():
+            self._refresh()
+            row = self._columns.row_of(todo_id)
+            if row is None:
+                return None
+            completed_at = datetime.now()
+            self._columns.complete(row, completed_at)
+            self._append({"op": "complete", "id": todo_id, "completed_at": completed_at})
+            return self._item(self._columns.row_of(todo_id))
     
     def delete_todo(self, todo_id: int) -> bool:
         """Delete a todo item."""
-        for i, todo in enumerate(self.todos):
-            if todo.id == todo_id:
-                del self.todos[i]
-                self.save_todos()
-                return True
-        return False
+        with self._lock, self.log.locked():
+            self._refresh()
+            row = self._columns.row_of(todo_id)
+            if row is None:
+                return False
+            self._columns.delete(row)
+            self._append({"op": "delete", "id": todo_id})
+            return True
+    
+    def get_todo(self, todo_id: int) -> Optional[TodoItem]:
+        """Get a todo item by id."""
+        with self._lock:
+            self._refresh()
+            row = self._columns.row_of(todo_id)
+            return self._item(row) if row is not None else None
+    
+    def _iter_rows(self, completed: Optional[bool] = None) -> Iterator[TodoItem]:
+        with self._lock:
+            self._refresh()
+            columns = self._columns
+        return (TodoItem(**columns.fields(row)) for row in columns.rows(completed))
+    
+    def iter_todos(self) -> Iterator[TodoItem]:
+        """Yield all todo items, building each one only when it is reached."""
+        return self._iter_rows()
+    
+    def iter_active_todos(self) -> Iterator[TodoItem]:
+        """Yield active (not completed) todo items one at a time."""
+        return self._iter_rows(completed=False)
+    
+    def iter_completed_todos(self) -> Iterator[TodoItem]:
+        """Yield completed todo items one at a time."""
+        return self._iter_rows(completed=True)
+    
+    def count_todos(self, completed: Optional[bool] = None) -> int:
+        """Count items without building them: all, active (False) or completed (True) ones."""
+        with self._lock:
+            self._refresh()
+            return self._columns.count(completed)
     
     def get_all_todos(self) -> List[TodoItem]:
         """Get all todo items."""
-        return self.todos
+        return list(self.iter_todos())
     
     def get_active_todos(self) -> List[TodoItem]:
         """Get all active (not completed) todo items."""
-        return [todo for todo in self.todos if not todo.completed]
+        return list(self.iter_active_todos())
     
     def get_completed_todos(self) -> List[TodoItem]:
         """Get all completed todo items."""
-        return [todo for todo in self.todos if todo.completed]
+        return list(self.iter_completed_todos())
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,262 @@
+"""
+Append-only operation log used as the storage engine of ``TodoManager``.
+
+Every mutation is one JSON line appended to the log instead of a rewrite of
+the whole file:
+
+    {"op": "header", "next_id": 42}
+    {"op": "add", "id": 41, "task": "Buy milk", "created_at": "2025-03-19T10:00:00"}
+    {"op": "complete", "id": 41, "completed_at": "2025-03-19T12:00:00"}
+    {"op": "delete", "id": 41}
+
+The optional header (written by compaction) stores the id counter so that
+ids are never reused, even after the item with the highest id is deleted.
+Compaction rewrites the log as a header plus one "add" record per live item,
+via a temporary file and an atomic rename.
+
+The log is read through a memory map, so replaying it does not copy the file
+into Python strings first, and the next free id can be found by scanning a
+few lines back from the end instead of replaying everything.
+
+Several processes may share one log. Writers hold an exclusive lock on a
+sidecar ``.lock`` file while they append or compact, and first read the
+records other processes appended since their last read (the version of what
+a process has read is the file identity plus the byte offset). Compaction
+replaces the file, which readers notice because its inode changes.
+"""
+import json
+import mmap
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Decoding str lines directly skips json.loads' per-call encoding detection
+_decoder = json.JSONDecoder()
+
+
+def _json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _file_id(stat: os.stat_result) -> Tuple[int, int]:
+    return stat.st_dev, stat.st_ino
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            # LK_LOCK retries for 10 seconds before giving up
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class LogReplaced(Exception):
+    """The log was compacted (replaced) by another process since it was last read."""
+
+
+class TodoLog:
+    """Line-oriented JSON operation log on disk."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Number of records in the log, used to decide when to compact
+        self.record_count = 0
+        # Identity of the file the records were read from, and how far
+        self.file_id: Optional[Tuple[int, int]] = None
+        self.offset = 0
+        self._lock_depth = 0
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the exclusive inter-process write lock. Re-entrant for the same
+        TodoLog; callers serialize threads themselves (TodoManager does).
+        """
+        if self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        with open(f"{self.path}.lock", "a+b") as lock_file:
+            _lock_file(lock_file)
+            self._lock_depth = 1
+            try:
+                yield
+            finally:
+                self._lock_depth = 0
+                _unlock_file(lock_file)
+
+    def changed(self) -> bool:
+        """Whether the log was appended to or replaced since it was last read (one stat call)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.file_id is not None
+        return _file_id(stat) != self.file_id or stat.st_size != self.offset
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def is_legacy_format(self) -> bool:
+        """Whether the file is an old-style JSON array written by the previous TodoManager."""
+        if not self.exists():
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    return line.lstrip().startswith("[")
+        return False
+
+    def read_records(self) -> Iterator[Dict[str, Any]]:
+        """Yield every record in the log. Corrupt lines (e.g. from a crash during append) are skipped."""
+        self.record_count = 0
+        self.file_id = None
+        self.offset = 0
+        return self._read_from(0, expected_id=None)
+
+    def read_new_records(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the records appended since the last read.
+
+        Raises:
+            LogReplaced: The file was compacted in the meantime; read it again from the start.
+        """
+        return self._read_from(self.offset, expected_id=self.file_id)
+
+    def _read_from(self, start: int, expected_id: Optional[Tuple[int, int]]) -> Iterator[Dict[str, Any]]:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            if expected_id is not None:
+                raise LogReplaced(self.path)
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            if expected_id is not None and _file_id(stat) != expected_id:
+                raise LogReplaced(self.path)
+            self.file_id = _file_id(stat)
+            if stat.st_size <= start:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                position = start
+                while True:
+                    # A line without its newline is still being written (or was cut
+                    # off by a crash); it is left for the next read
+                    end = mapped.find(b"\n", position)
+                    if end == -1:
+                        break
+                    line = mapped[position:end]
+                    position = self.offset = end + 1
+                    if not line.strip():
+                        continue
+                    try:
+                        record = _decoder.decode(line.decode("utf-8"))
+                    except ValueError:
+                        print(f"Skipping corrupt todo log line: {line.strip()[:80]!r}")
+                        continue
+                    self.record_count += 1
+                    yield record
+
+    def read_next_id(self) -> int:
+        """
+        Return the next free id without replaying the log.
+
+        Ids are handed out in increasing order and every add is appended, so
+        the last "add" record holds the highest id ever used after the header
+        (which stores the counter as of the last compaction). Only the lines
+        after that record are read, scanning backwards from the end.
+        """
+        if not self.exists():
+            return 1
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 1
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                next_id = 1
+                header = self._parse(mapped[:mapped.find(b"\n") + 1 or len(mapped)])
+                if header and header.get("op") == "header":
+                    next_id = header["next_id"]
+                end = len(mapped)
+                while end > 0:
+                    start = mapped.rfind(b"\n", 0, end - 1) + 1
+                    record = self._parse(mapped[start:end])
+                    end = start
+                    if record is None:
+                        continue
+                    if record.get("op") == "add":
+                        return max(next_id, record["id"] + 1)
+                    if record.get("op") == "header":
+                        break
+                return next_id
+
+    @staticmethod
+    def _parse(line: bytes):
+        try:
+            return json.loads(line) if line.strip() else None
+        except ValueError:
+            return None
+
+    def append(self, record: Dict[str, Any]):
+        """
+        Append one record. This is the only I/O a single mutation needs.
+        Call it with the log locked and after reading the other writers' records.
+        """
+        line = (json.dumps(record, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8")
+        with open(self.path, "a+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                # Terminate a line cut off by a crashed writer so ours stays parseable
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            if _file_id(os.fstat(f.fileno())) == self.file_id:
+                self.offset = size + len(line)
+        self.record_count += 1
+
+    def rewrite(self, records: Iterable[Dict[str, Any]]):
+        """Atomically replace the log with the given records (used for compaction, with the log locked)."""
+        tmp_path = f"{self.path}.tmp"
+        count = 0
+        with open(tmp_path, "wb") as f:
+            for record in records:
+                f.write((json.dumps(record, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8"))
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+            stat = os.fstat(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.record_count = count
+        self.file_id = _file_id(stat)
+        self.offset = stat.st_size
+
+
+def read_legacy_json(path: str) -> List[Dict[str, Any]]:
+    """Read a todos file in the old JSON-array format."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
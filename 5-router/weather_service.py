@@ -1,6 +1,33 @@
+import os
+import sys
 import requests
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
 import re
+from geocode_cache import GeocodeCache
+
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.forecast_cache import ForecastCache
+
+# Coordinates never change, so geocoding results are kept on disk between runs
+geocode_cache = GeocodeCache(
+    os.getenv("GEOCODE_CACHE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_cache.sqlite3"))
+)
+if os.getenv("GEOCODE_WARMUP_CSV"):
+    geocode_cache.warm_up_from_csv(os.getenv("GEOCODE_WARMUP_CSV"))
+
+# Forecasts are shared per 0.1° grid cell and expire at the next hourly update
+forecast_cache = ForecastCache(grid=0.1, update_interval=3600)
+FORECAST_VARIANT = "daily-min-max-precipitation"
+
+# One pooled HTTP session reuses connections to Nominatim and Open-Meteo
+http_session = requests.Session()
+
+# Maximum number of coordinates sent in one bulk Open-Meteo request
+FORECAST_BATCH_SIZE = 50
+# Maximum number of geocoding lookups running at the same time
+GEOCODE_WORKERS = 8
 
 def extract_location(question: str) -> Optional[str]:
     """Extract location from a weather-related question."""
@@ -19,8 +46,8 @@ def extract_location(question: str) -> Optional[str]:
     
     return None
 
-def geocode_location(location: str) -> Optional[Dict[str, float]]:
-    """Convert location name to latitude and longitude."""
+def _fetch_geocode(location: str) -> Optional[Dict[str, float]]:
+    """Ask Nominatim for the coordinates of a location. Raises on network/HTTP errors."""
     url = "https://nominatim.openstreetmap.org/search"
     params = {
         "q": location,
@@ -31,16 +58,22 @@ def geocode_location(location: str) -> Optional[Dict[str, float]]:
         "User-Agent": "WeatherApp/1.0"  # Required by Nominatim's ToS
     }
     
+    response = http_session.get(url, params=params, headers=headers)
+    # Errors are raised (not returned as None) so they are never cached as "not found"
+    response.raise_for_status()
+    data = response.json()
+    if data and len(data) > 0:
+        return {
+            "latitude": float(data[0]["lat"]),
+            "longitude": float(data[0]["lon"]),
+            "display_name": data[0]["display_name"]
+        }
+    return None
+
+def geocode_location(location: str) -> Optional[Dict[str, float]]:
+    """Convert location name to latitude and longitude."""
     try:
-        response = requests.get(url, params=params, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            if data and len(data) > 0:
-                return {
-                    "latitude": float(data[0]["lat"]),
-                    "longitude": float(data[0]["lon"]),
-                    "display_name": data[0]["display_name"]
-                }
+        return geocode_cache.lookup(location, _fetch_geocode)
     except Exception as e:
         print(f"Error geocoding location: {e}")
     
@@ -49,38 +82,47 @@ def geocode_location(location: str) -> Optional[Dict[str, float]]:
 def get_weather(latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
     """
     Retrieves today's temperature data from the Open-Meteo API for the specified coordinates.
+    Nearby coordinates share one cached forecast until the next forecast update.
     """
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
+    return forecast_cache.get(latitude, longitude, fetch=fetch_forecast, variant=FORECAST_VARIANT)
+
+def _forecast_params(latitudes: List[float], longitudes: List[float]) -> Dict[str, Any]:
+    return {
+        "latitude": ",".join(str(latitude) for latitude in latitudes),
+        "longitude": ",".join(str(longitude) for longitude in longitudes),
         "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum",
         "timezone": "auto",
         "forecast_days": 1  # Only get today's forecast
     }
+
+def _parse_forecast(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn one Open-Meteo forecast object into our weather dict."""
+    date = data.get("daily", {}).get("time", [])[0]  # Get today's date
+    temp_max = data.get("daily", {}).get("temperature_2m_max", [])[0]
+    temp_min = data.get("daily", {}).get("temperature_2m_min", [])[0]
+    precipitation = data.get("daily", {}).get("precipitation_sum", [])[0]
+    
+    # Format the result
+    return {
+        "date": date,
+        "max_temperature": temp_max,
+        "min_temperature": temp_min,
+        "precipitation": precipitation,
+        "units": {
+            "temperature": data.get("daily_units", {}).get("temperature_2m_max", "°C"),
+            "precipitation": data.get("daily_units", {}).get("precipitation_sum", "mm")
+        }
+    }
+
+def fetch_forecast(latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
+    """Requests today's forecast from Open-Meteo. Returns None if the request fails."""
+    url = "https://api.open-meteo.com/v1/forecast"
     
     try:
-        response = requests.get(url, params=params)
+        response = http_session.get(url, params=_forecast_params([latitude], [longitude]))
         
         if response.status_code == 200:
-            data = response.json()
-            date = data.get("daily", {}).get("time", [])[0]  # Get today's date
-            temp_max = data.get("daily", {}).get("temperature_2m_max", [])[0]
-            temp_min = data.get("daily", {}).get("temperature_2m_min", [])[0]
-            precipitation = data.get("daily", {}).get("precipitation_sum", [])[0]
-            
-            # Format the result
-            result = {
-                "date": date,
-                "max_temperature": temp_max,
-                "min_temperature": temp_min,
-                "precipitation": precipitation,
-                "units": {
-                    "temperature": data.get("daily_units", {}).get("temperature_2m_max", "°C"),
-                    "precipitation": data.get("daily_units", {}).get("precipitation_sum", "mm")
-                }
-            }
-            return result
+            return _parse_forecast(response.json())
         else:
             print(f"Weather API request failed with status code: {response.status_code}")
     except Exception as e:
@@ -88,6 +130,21 @@ def get_weather(latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
     
     return None
 
+def fetch_forecasts(coordinates: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    Requests today's forecast for many (latitude, longitude) pairs in one Open-Meteo call.
+    Raises on network/HTTP errors.
+    """
+    url = "https://api.open-meteo.com/v1/forecast"
+    latitudes = [latitude for latitude, _ in coordinates]
+    longitudes = [longitude for _, longitude in coordinates]
+    response = http_session.get(url, params=_forecast_params(latitudes, longitudes))
+    response.raise_for_status()
+    data = response.json()
+    # A single location returns an object, several locations return a list
+    items = data if isinstance(data, list) else [data]
+    return [_parse_forecast(item) for item in items]
+
 def is_weather_question(question: str) -> bool:
     """Determine if a question is asking about weather."""
     weather_keywords = [
@@ -108,6 +165,65 @@ def get_weather_for_location(location: str) -> Optional[Dict[str, Any]]:
             return weather_data
     return None
 
+def get_weather_for_locations(locations: List[str]) -> List[Dict[str, Any]]:
+    """
+    Get weather for many locations at once.
+
+    Locations are geocoded concurrently, cached forecasts are reused, and the
+    remaining coordinates are fetched in bulk Open-Meteo requests of at most
+    FORECAST_BATCH_SIZE locations.
+
+    Returns:
+        list: One dict per input location, in input order, with "location",
+              "weather" (None on failure) and "error" (None on success).
+    """
+    results = [{"location": location, "weather": None, "error": None} for location in locations]
+    unique_locations = list(dict.fromkeys(locations))
+    
+    with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as executor:
+        geo_by_location = dict(zip(unique_locations, executor.map(geocode_location, unique_locations)))
+    
+    weather_by_location: Dict[str, Dict[str, Any]] = {}
+    missing: Dict[tuple, List[str]] = {}
+    for location, geo_data in geo_by_location.items():
+        if not geo_data:
+            continue
+        cached = forecast_cache.peek(geo_data["latitude"], geo_data["longitude"], FORECAST_VARIANT)
+        if cached is not None:
+            weather_by_location[location] = cached
+        else:
+            cell = forecast_cache.quantize(geo_data["latitude"], geo_data["longitude"])
+            missing.setdefault(cell, []).append(location)
+    
+    errors: Dict[str, str] = {}
+    cells = list(missing)
+    for start in range(0, len(cells), FORECAST_BATCH_SIZE):
+        batch = cells[start:start + FORECAST_BATCH_SIZE]
+        try:
+            forecasts = fetch_forecasts(batch)
+        except Exception as e:
+            for cell in batch:
+                for location in missing[cell]:
+                    errors[location] = f"Error getting weather data: {e}"
+            continue
+        for cell, forecast in zip(batch, forecasts):
+            forecast_cache.prime(cell[0], cell[1], forecast, FORECAST_VARIANT)
+            for location in missing[cell]:
+                weather_by_location[location] = dict(forecast)
+    
+    for result in results:
+        location = result["location"]
+        geo_data = geo_by_location.get(location)
+        if not geo_data:
+            result["error"] = f"Could not find location: {location}"
+        elif location in weather_by_location:
+            weather = dict(weather_by_location[location])
+            weather["location"] = geo_data["display_name"]
+            result["weather"] = weather
+        else:
+            result["error"] = errors.get(location, "No forecast returned")
+    return results
+
 def format_weather_response(weather_data: Dict[str, Any]) -> str:
     """Format weather data into a human-readable response."""
     location = weather_data.get("location", "the requested location")
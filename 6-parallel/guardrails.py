@@ -0,0 +1,330 @@
+"""
+Short-circuiting runner for parallel guardrail checks.
+
+All checks start at the same time and their results are judged as they
+complete. As soon as the verdict can no longer change (e.g. one check failed
+and every check must pass), the checks still running are cancelled, so a
+rejected request comes back at the latency of the fastest failing check
+instead of the slowest check.
+
+Guardrails that declare their response ``schema`` and ``prompt`` can also
+run fused: one structured model call whose response model has one field per
+guardrail (built with ``pydantic.create_model``), after which every field is
+judged by its own guardrail. ``mode="adaptive"`` measures both modes on a
+sample of requests (latency EWMA and agreement of the verdicts) and uses the
+fused call while it is accurate enough and not much slower. On a sampled
+request the fan-out verdict is returned as soon as it is decided; the fused
+call finishes in the background and only updates the measurements.
+
+Usage:
+    runner = GuardrailRunner([
+        Guardrail("calendar", validate_calendar_request, passes=lambda r: r.is_calendar_request,
+                  min_confidence=0.7),
+        Guardrail("security", check_security, passes=lambda r: r.is_safe, timeout=5),
+    ])
+    verdict = await runner.run(user_input)
+    if not verdict.allowed: ...
+"""
+import asyncio
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+
+from pydantic import BaseModel, Field, create_model
+
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.gemini_client import agenerate_structured
+from shared.response_cache import ResponseCache
+
+
+@dataclass
+class Guardrail:
+    """
+    One async check and how to judge its result.
+
+    Parameters:
+        name (str): Name used in the verdict.
+        check: Async function called with the user input.
+        passes: Returns whether the check result lets the request through.
+        min_confidence (float): Optional extra requirement on ``result.<confidence_field>``.
+        confidence_field (str): Attribute holding the confidence score.
+        timeout (float): Seconds before the check counts as timed out; None uses the runner default.
+        fail_open (bool): Whether a timeout or error passes (True) or rejects (False);
+            None uses the runner default.
+        schema: Pydantic response model of the check (needed for fused mode).
+        prompt: Builds the check's prompt from the user input (needed for fused mode).
+    """
+    name: str
+    check: Callable[[str], Awaitable[Any]]
+    passes: Callable[[Any], bool] = bool
+    min_confidence: Optional[float] = None
+    confidence_field: str = "confidence_score"
+    timeout: Optional[float] = None
+    fail_open: Optional[bool] = None
+    schema: Optional[Type[BaseModel]] = None
+    prompt: Optional[Callable[[str], str]] = None
+
+
+@dataclass
+class CheckOutcome:
+    name: str
+    passed: bool
+    # "passed", "failed", "timeout" or "error"
+    status: str
+    result: Any = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+@dataclass
+class GuardrailVerdict:
+    allowed: bool
+    outcomes: Dict[str, CheckOutcome] = field(default_factory=dict)
+    # Checks cancelled because the verdict was already decided
+    cancelled: List[str] = field(default_factory=list)
+    # Name of the check whose result decided the verdict
+    decided_by: Optional[str] = None
+    seconds: float = 0.0
+    # "fanout" or "fused"
+    mode: str = "fanout"
+
+
+def fuse_schemas(guardrails: List[Guardrail]) -> Type[BaseModel]:
+    """One response model with a field per guardrail, typed with that guardrail's schema."""
+    fields = {}
+    for guardrail in guardrails:
+        if not guardrail.name.isidentifier():
+            raise ValueError(f"Guardrail name {guardrail.name!r} cannot be used as a field name")
+        description = (guardrail.schema.__doc__ or guardrail.name).strip()
+        fields[guardrail.name] = (guardrail.schema, Field(description=description))
+    return create_model("FusedGuardrailResult", **fields)
+
+
+def build_fused_prompt(guardrails: List[Guardrail], user_input: str) -> str:
+    sections = "\n\n".join(
+        f'Check "{guardrail.name}":\n{guardrail.prompt(user_input).strip()}' for guardrail in guardrails
+    )
+    return (
+        "Perform each of the following independent checks and return every result "
+        "in the field with the same name as the check.\n\n" + sections
+    )
+
+
+class _Ewma:
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def add(self, sample: float):
+        self.value = sample if self.value is None else self.alpha * sample + (1 - self.alpha) * self.value
+
+
+class GuardrailRunner:
+    """
+    Run guardrails concurrently and stop as soon as the verdict is decided.
+
+    Parameters:
+        guardrails: The checks to run.
+        min_passed (int): How many checks must pass. None means all of them
+            (any failure rejects); 1 means any passing check accepts.
+        timeout (float): Default per-check timeout in seconds (None: no timeout).
+        fail_open (bool): Default policy for checks that time out or raise.
+        mode (str): "fanout" (one call per check), "fused" (one combined call)
+            or "adaptive" (choose by measured latency and agreement).
+        model (str): Model used for the fused call.
+        cache (ResponseCache): Optional response cache for the fused call.
+        warmup (int): Adaptive mode: requests that also run the fused call in the
+            background before choosing.
+        sample_every (int): Adaptive mode: after warmup, every n-th request is
+            sampled again to keep the measurements current.
+        min_agreement (float): Adaptive mode: fraction of sampled requests on
+            which the fused verdict must match the fan-out verdict.
+        max_latency_ratio (float): Adaptive mode: how much slower than fan-out
+            the fused call may be (it still halves the request count).
+    """
+
+    def __init__(self, guardrails: List[Guardrail], min_passed: Optional[int] = None,
+                 timeout: Optional[float] = None, fail_open: bool = False, mode: str = "fanout",
+                 model: str = "gemini-2.0-flash", cache: Optional[ResponseCache] = None, warmup: int = 5, sample_every: int = 20,
+                 min_agreement: float = 0.95, max_latency_ratio: float = 1.25, ewma_alpha: float = 0.2):
+        if mode not in ("fanout", "fused", "adaptive"):
+            raise ValueError(f"Unknown guardrail mode: {mode}")
+        self.guardrails = list(guardrails)
+        self.min_passed = len(self.guardrails) if min_passed is None else min_passed
+        self.timeout = timeout
+        self.fail_open = fail_open
+        self.mode = mode
+        self.model = model
+        self.cache = cache
+        self.warmup = warmup
+        self.sample_every = sample_every
+        self.min_agreement = min_agreement
+        self.max_latency_ratio = max_latency_ratio
+        self._fused_schema: Optional[Type[BaseModel]] = None
+        if mode != "fanout":
+            missing = [guardrail.name for guardrail in self.guardrails if guardrail.schema is None or guardrail.prompt is None]
+            if missing:
+                raise ValueError(f"Fused mode needs a schema and prompt for: {', '.join(missing)}")
+            self._fused_schema = fuse_schemas(self.guardrails)
+        self._latency = {"fanout": _Ewma(ewma_alpha), "fused": _Ewma(ewma_alpha)}
+        self._requests = 0
+        # Sampled requests started, and those whose fused shadow call has finished
+        self._sampled = 0
+        self._samples = 0
+        self._agreements = 0
+        self._shadows = set()
+
+    async def run(self, user_input: str) -> GuardrailVerdict:
+        """Return the verdict for one input, using the configured (or currently chosen) mode."""
+        mode = self.mode
+        if mode == "adaptive":
+            self._requests += 1
+            if self._sampled < self.warmup or self._requests % self.sample_every == 0:
+                return await self._run_sampled(user_input)
+            mode = self.choose_mode()
+        return await (self.run_fused(user_input) if mode == "fused" else self.run_fanout(user_input))
+
+    def choose_mode(self) -> str:
+        """The mode adaptive runs use: fused while it agrees with fan-out and is fast enough."""
+        fanout, fused = self._latency["fanout"].value, self._latency["fused"].value
+        if not self._samples or fanout is None or fused is None:
+            return "fanout"
+        agreement = self._agreements / self._samples
+        if agreement >= self.min_agreement and fused <= fanout * self.max_latency_ratio:
+            return "fused"
+        return "fanout"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "chosen_mode": self.choose_mode() if self.mode == "adaptive" else self.mode,
+            "fanout_latency": self._latency["fanout"].value,
+            "fused_latency": self._latency["fused"].value,
+            "samples": self._samples,
+            "agreement": self._agreements / self._samples if self._samples else None,
+        }
+
+    async def _run_sampled(self, user_input: str) -> GuardrailVerdict:
+        """
+        Return the fan-out verdict, with the fused call running as a shadow.
+
+        The caller does not wait for the fused call: it finishes in a
+        background task and is then compared with the fan-out verdict.
+        """
+        self._sampled += 1
+        shadow = asyncio.create_task(self.run_fused(user_input))
+        self._shadows.add(shadow)
+        try:
+            fanout = await self.run_fanout(user_input)
+        except BaseException:
+            shadow.cancel()
+            self._shadows.discard(shadow)
+            raise
+        shadow.add_done_callback(lambda task: self._record_sample(task, fanout))
+        return fanout
+
+    def _record_sample(self, shadow: asyncio.Task, fanout: GuardrailVerdict):
+        self._shadows.discard(shadow)
+        if shadow.cancelled():
+            return
+        self._samples += 1
+        self._agreements += fanout.allowed == shadow.result().allowed
+
+    async def run_fused(self, user_input: str) -> GuardrailVerdict:
+        """Run all guardrails in one structured call and judge each field with its guardrail."""
+        start = time.perf_counter()
+        verdict = GuardrailVerdict(allowed=False, mode="fused")
+        timeouts = [guardrail.timeout if guardrail.timeout is not None else self.timeout for guardrail in self.guardrails]
+        timeout = None if None in timeouts else max(timeouts)
+        try:
+            combined = await asyncio.wait_for(
+                agenerate_structured(
+                    model=self.model,
+                    contents=build_fused_prompt(self.guardrails, user_input),
+                    schema=self._fused_schema,
+                    cache=self.cache,
+                ),
+                timeout,
+            )
+            error, status = None, None
+        except asyncio.TimeoutError:
+            combined, error, status = None, f"Timed out after {timeout}s", "timeout"
+        except Exception as e:
+            combined, error, status = None, str(e), "error"
+
+        seconds = time.perf_counter() - start
+        for guardrail in self.guardrails:
+            if status is not None:
+                fail_open = guardrail.fail_open if guardrail.fail_open is not None else self.fail_open
+                outcome = CheckOutcome(guardrail.name, fail_open, status, error=error, seconds=seconds)
+            else:
+                outcome = self._judge(guardrail, getattr(combined, guardrail.name, None), seconds)
+            verdict.outcomes[guardrail.name] = outcome
+        verdict.allowed = sum(outcome.passed for outcome in verdict.outcomes.values()) >= self.min_passed
+        verdict.seconds = seconds
+        self._latency["fused"].add(seconds)
+        return verdict
+
+    async def run_fanout(self, user_input: str) -> GuardrailVerdict:
+        """Run one call per guardrail and stop as soon as the verdict is decided."""
+        start = time.perf_counter()
+        verdict = GuardrailVerdict(allowed=False)
+        required = self.min_passed
+        # Verdict is decided once `required` checks passed or too many failed to reach it
+        allowed_failures = len(self.guardrails) - required
+        passed = failed = 0
+
+        tasks = {
+            asyncio.create_task(self._run_one(guardrail, user_input)): guardrail.name
+            for guardrail in self.guardrails
+        }
+        try:
+            if required <= 0:
+                verdict.allowed = True
+                return verdict
+            for next_done in asyncio.as_completed(tasks):
+                outcome = await next_done
+                verdict.outcomes[outcome.name] = outcome
+                if outcome.passed:
+                    passed += 1
+                else:
+                    failed += 1
+                if passed >= required or failed > allowed_failures:
+                    verdict.allowed = passed >= required
+                    verdict.decided_by = outcome.name
+                    break
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+                verdict.cancelled.append(tasks[task])
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            verdict.seconds = time.perf_counter() - start
+            self._latency["fanout"].add(verdict.seconds)
+        return verdict
+
+    async def _run_one(self, guardrail: Guardrail, user_input: str) -> CheckOutcome:
+        timeout = guardrail.timeout if guardrail.timeout is not None else self.timeout
+        fail_open = guardrail.fail_open if guardrail.fail_open is not None else self.fail_open
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(guardrail.check(user_input), timeout)
+        except asyncio.TimeoutError:
+            return CheckOutcome(guardrail.name, fail_open, "timeout",
+                                error=f"Timed out after {timeout}s", seconds=time.perf_counter() - start)
+        except Exception as e:
+            return CheckOutcome(guardrail.name, fail_open, "error", error=str(e),
+                                seconds=time.perf_counter() - start)
+
+        return self._judge(guardrail, result, time.perf_counter() - start)
+
+    @staticmethod
+    def _judge(guardrail: Guardrail, result: Any, seconds: float) -> CheckOutcome:
+        ok = result is not None and bool(guardrail.passes(result))
+        if ok and guardrail.min_confidence is not None:
+            ok = getattr(result, guardrail.confidence_field, 0.0) >= guardrail.min_confidence
+        return CheckOutcome(guardrail.name, ok, "passed" if ok else "failed", result=result, seconds=seconds)
@@ -0,0 +1,221 @@
+"""
+Voting executor: the same structured prompt answered K times in parallel.
+
+All K calls start together (optionally spread across several models) and are
+aggregated field by field as they come back:
+
+- booleans, enums, literals and strings: majority vote
+- numbers (e.g. ``confidence_score``): median (or mean)
+- lists (e.g. ``risk_flags``): union, in first-seen order
+
+Agreement is the share of votes that match the majority, taken over every
+majority-voted field (the lowest one counts). Once ``min_votes`` votes are in
+and agreement reaches the threshold, the remaining calls are cancelled, so a
+clear-cut decision costs about one call's latency and only ambiguous inputs
+wait for all K votes.
+
+Usage:
+    voter = VotingExecutor(SecurityCheck, models=["gemini-2.0-flash"], k=5, prefer={"is_safe": False})
+    vote = await voter.run(prompt)
+    vote.result.is_safe, vote.agreement
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, List, Optional, Sequence, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.gemini_client import agenerate_content
+
+
+@dataclass
+class VoteResult:
+    # Aggregated response (an instance of the schema)
+    result: BaseModel
+    # Lowest majority share over the majority-voted fields
+    agreement: float
+    field_agreement: Dict[str, float] = field(default_factory=dict)
+    votes: List[BaseModel] = field(default_factory=list)
+    requested: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    # True when the remaining calls were cancelled because agreement was reached
+    stopped_early: bool = False
+    seconds: float = 0.0
+
+
+def _field_kind(annotation) -> str:
+    """How a field is aggregated: "majority", "numeric" or "union"."""
+    # Optional[X] is aggregated like X
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            annotation = args[0]
+    if get_origin(annotation) in (list, set, tuple):
+        return "union"
+    if annotation in (int, float):
+        return "numeric"
+    # bool, str, enums, literals, nested models: majority over the serialized value
+    return "majority"
+
+
+def _key(value: Any) -> str:
+    """Hashable identity of a vote value."""
+    if isinstance(value, BaseModel):
+        value = value.model_dump(mode="json")
+    elif isinstance(value, Enum):
+        value = value.value
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class VotingExecutor:
+    """
+    Run one structured prompt K times concurrently and aggregate the answers.
+
+    Parameters:
+        schema: Pydantic response model.
+        models: Model id or list of model ids; votes are assigned round-robin.
+        k (int): Maximum number of votes.
+        min_votes (int): Votes needed before stopping early.
+        agreement (float): Majority share at which the vote stops early.
+        temperature (float): Sampling temperature, so repeated calls can differ.
+        numeric (str): "median" or "mean" for numeric fields.
+        prefer (dict): Value each majority field takes on a tie, e.g. ``{"is_safe": False}``.
+        timeout (float): Seconds after which the vote is decided with the answers received so far.
+    """
+
+    def __init__(self, schema: Type[BaseModel], models: Union[str, Sequence[str]] = "gemini-2.0-flash",
+                 k: int = 5, min_votes: int = 3, agreement: float = 0.8, temperature: float = 1.0,
+                 numeric: str = "median", prefer: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None):
+        if numeric not in ("median", "mean"):
+            raise ValueError(f"Unknown numeric aggregation: {numeric}")
+        self.schema = schema
+        self.models = [models] if isinstance(models, str) else list(models)
+        self.k = k
+        self.min_votes = min(min_votes, k)
+        self.agreement = agreement
+        self.temperature = temperature
+        self.numeric = numeric
+        self.prefer = prefer or {}
+        self.timeout = timeout
+        self.kinds = {name: _field_kind(info.annotation) for name, info in schema.model_fields.items()}
+
+    async def run(self, contents) -> VoteResult:
+        """Collect votes for ``contents`` and return the aggregated answer."""
+        start = time.perf_counter()
+        deadline = None if self.timeout is None else start + self.timeout
+        pending = {
+            asyncio.create_task(self._vote(self.models[i % len(self.models)], contents))
+            for i in range(self.k)
+        }
+        votes: List[BaseModel] = []
+        errors: List[Exception] = []
+        stopped_early = False
+        try:
+            while pending:
+                remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Timed out: decide with what we have
+                    break
+                for task in done:
+                    try:
+                        votes.append(task.result())
+                    except Exception as e:
+                        errors.append(e)
+                if pending and len(votes) >= self.min_votes and self._agreement(votes)[0] >= self.agreement:
+                    stopped_early = True
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if not votes:
+            if errors:
+                raise errors[0]
+            raise TimeoutError(f"No votes received within {self.timeout}s")
+        agreement, field_agreement = self._agreement(votes)
+        return VoteResult(
+            result=self.aggregate(votes),
+            agreement=agreement,
+            field_agreement=field_agreement,
+            votes=votes,
+            requested=self.k,
+            failed=len(errors),
+            cancelled=len(pending),
+            stopped_early=stopped_early,
+            seconds=time.perf_counter() - start,
+        )
+
+    async def _vote(self, model: str, contents) -> BaseModel:
+        # Called directly rather than through agenerate_structured: identical
+        # votes must not be coalesced or served from the response cache
+        response = await agenerate_content(
+            model=model,
+            contents=contents,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": self.schema,
+                "temperature": self.temperature,
+            },
+        )
+        if response.parsed is None:
+            raise ValueError(f"Vote from {model} could not be parsed")
+        return response.parsed
+
+    def aggregate(self, votes: List[BaseModel]) -> BaseModel:
+        """Combine the votes into one instance of the schema."""
+        combined = {}
+        for name, kind in self.kinds.items():
+            values = [getattr(vote, name) for vote in votes]
+            present = [value for value in values if value is not None]
+            if not present:
+                combined[name] = None
+            elif kind == "numeric":
+                combined[name] = statistics.median(present) if self.numeric == "median" else statistics.fmean(present)
+                if isinstance(present[0], int) and not isinstance(present[0], bool):
+                    combined[name] = round(combined[name])
+            elif kind == "union":
+                seen = {}
+                for value in present:
+                    for item in value:
+                        seen.setdefault(_key(item), item)
+                combined[name] = list(seen.values())
+            else:
+                combined[name] = self._majority(name, values)[0]
+        return self.schema.model_validate(combined)
+
+    def _majority(self, name: str, values: List[Any]):
+        """Return (winning value, its share of the votes)."""
+        counts: Dict[str, int] = {}
+        first: Dict[str, Any] = {}
+        for value in values:
+            key = _key(value)
+            counts[key] = counts.get(key, 0) + 1
+            first.setdefault(key, value)
+        top = max(counts.values())
+        leaders = [key for key in counts if counts[key] == top]
+        winner = leaders[0]
+        if len(leaders) > 1 and name in self.prefer and _key(self.prefer[name]) in leaders:
+            winner = _key(self.prefer[name])
+        return first[winner], top / len(values)
+
+    def _agreement(self, votes: List[BaseModel]):
+        """Lowest majority share over the majority-voted fields, and the share per field."""
+        per_field = {
+            name: self._majority(name, [getattr(vote, name) for vote in votes])[1]
+            for name, kind in self.kinds.items()
+            if kind == "majority"
+        }
+        return min(per_field.values(), default=1.0), per_field
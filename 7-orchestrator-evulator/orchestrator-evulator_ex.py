@@ -1,20 +1,24 @@
-from google import genai
+import asyncio
 import os
-from dotenv import load_dotenv
+import sys
+import time
 from pydantic import BaseModel, Field
-from typing import List, Dict
-# Load environment variables from .env file
-load_dotenv()
+from typing import List, Dict, Optional, Tuple
 
-# Get API key from environment variable
-api_key = os.getenv("GOOGLE_AI_API_KEY")
+# Make the shared package at the repository root importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.gemini_client import agenerate_content, generate_content
+from shared.runtime import run_sync
 
-client = genai.Client(api_key=api_key)
 model = "gemini-2.0-flash"
 
 class SubTask(BaseModel):
     """Blog section task defined by orchestrator"""
 
+    id: str = Field(description="Short unique identifier of this section, e.g. 'intro'")
+    depends_on: List[str] = Field(
+        description="Ids of the sections this section must build on; empty if it can be written on its own"
+    )
     section_type: str = Field(description="Type of blog section to write")
     description: str = Field(description="What this section should cover")
     style_guide: str = Field(description="Writing style for this section")
@@ -71,11 +75,17 @@ Define the target audience and their interests/needs.
 
 # Sections
 ## Section 1
+- Id: short unique identifier
 - Type: section_type
 - Description: what this section should cover
 - Style: writing style guidelines
+- Depends on: ids of the sections whose content this section needs
 
 [Additional sections as needed...]
+
+Sections without dependencies are written at the same time, so only declare a
+dependency when a section really has to refer to another one (for example a
+conclusion that sums up earlier sections).
 """
 
 WORKER_PROMPT = """
@@ -84,6 +94,10 @@ Topic: {topic}
 Section Type: {section_type}
 Section Goal: {description}
 Style Guide: {style_guide}
+Target Length: {target_length} words
+
+Sections this one builds on:
+{previous_sections}
 
 Return your response in this format:
 
@@ -112,13 +126,63 @@ For suggested edits, focus on improving transitions and maintaining consistent t
 The final version should incorporate your suggested improvements into a polished, cohesive blog post.
 """
 
+def resolve_dependencies(sections: List[SubTask]) -> Dict[str, List[str]]:
+    """
+    Map every section id to the ids it has to wait for.
+
+    Duplicate ids are made unique, and unknown ids, self-references and
+    dependencies that would close a cycle are dropped, so the result is
+    always a DAG.
+    """
+    seen = set()
+    for index, section in enumerate(sections):
+        section_id = section.id or f"section-{index + 1}"
+        while section_id in seen:
+            section_id = f"{section_id}-{index + 1}"
+        section.id = section_id
+        seen.add(section_id)
+
+    dependencies = {
+        section.id: [dep for dep in dict.fromkeys(section.depends_on) if dep in seen and dep != section.id]
+        for section in sections
+    }
+    # Depth-first in plan order; an edge back to a section still being visited closes a cycle
+    visiting, done = set(), set()
+
+    def visit(section_id: str):
+        visiting.add(section_id)
+        kept = []
+        for dep in dependencies[section_id]:
+            if dep in visiting:
+                continue
+            if dep not in done:
+                visit(dep)
+            kept.append(dep)
+        dependencies[section_id] = kept
+        visiting.discard(section_id)
+        done.add(section_id)
+
+    for section in sections:
+        if section.id not in done:
+            visit(section.id)
+    return dependencies
+
+
+def section_label(section: SubTask) -> str:
+    """Section type plus id; plans often have several sections of the same type."""
+    return f"{section.section_type} ({section.id})"
+
+
 class BlogOrchestrator:
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 4):
+        # Written sections by section id
         self.sections_content = {}
+        # Maximum number of sections written at the same time
+        self.max_concurrency = max_concurrency
 
     def get_plan(self, topic: str, target_length: int, style: str) -> OrchestratorPlan:
         """Get orchestrator's blog structure plan"""
-        response = client.models.generate_content(
+        response = generate_content(
             model=model,
             contents=ORCHESTRATOR_PROMPT.format(
                             topic=topic, target_length=target_length, style=style
@@ -130,25 +194,34 @@ class BlogOrchestrator:
         )
         return response.parsed
 
-    def write_section(self, topic: str, section: SubTask) -> SectionContent:
-        """Worker: Write a specific blog section with context from previous sections.
+    def write_section(
+        self, topic: str, section: SubTask, dependencies: Optional[List[Tuple[SubTask, SectionContent]]] = None
+    ) -> SectionContent:
+        """Worker: Write a specific blog section (blocking wrapper around ``awrite_section``)."""
+        return run_sync(self.awrite_section(topic, section, dependencies))
+
+    async def awrite_section(
+        self, topic: str, section: SubTask, dependencies: Optional[List[Tuple[SubTask, SectionContent]]] = None
+    ) -> SectionContent:
+        """Worker: Write a specific blog section with context from the sections it depends on.
 
         Args:
             topic: The main blog topic
             section: SubTask containing section details
+            dependencies: (section, content) pairs of the written sections this one builds on
 
         Returns:
             SectionContent: The written content and key points
         """
-        # Create context from previously written sections
+        # Create context from the sections this one depends on
         previous_sections = "\n\n".join(
             [
-                f"=== {section_type} ===\n{content.content}"
-                for section_type, content in self.sections_content.items()
+                f"=== {section_label(dependency)} ===\n{content.content}"
+                for dependency, content in (dependencies or [])
             ]
         )
 
-        response = client.models.generate_content(
+        response = await agenerate_content(
             model=model,
             contents=WORKER_PROMPT.format(
                 topic=topic,
@@ -158,7 +231,7 @@ class BlogOrchestrator:
                 target_length=section.target_length,
                 previous_sections=previous_sections
                 if previous_sections
-                else "This is the first section.",
+                else "None, this section stands on its own.",
             ),
             config={
                 "response_mime_type": "application/json",
@@ -167,16 +240,49 @@ class BlogOrchestrator:
         )
         return response.parsed
 
+    async def awrite_sections(self, topic: str, sections: List[SubTask]) -> List[SectionContent]:
+        """
+        Write the sections as a dependency graph.
+
+        Every section starts as soon as the sections it depends on are written,
+        with at most ``max_concurrency`` sections being written at a time.
+
+        Returns:
+            List[SectionContent]: The written sections in plan order.
+        """
+        dependencies = resolve_dependencies(sections)
+        by_id = {section.id: section for section in sections}
+        slots = asyncio.Semaphore(self.max_concurrency)
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def write(section: SubTask) -> SectionContent:
+            context = [(by_id[dep], await tasks[dep]) for dep in dependencies[section.id]]
+            async with slots:
+                print(f"Writing section: {section_label(section)}")
+                return await self.awrite_section(topic, section, context)
+
+        for section in sections:
+            tasks[section.id] = asyncio.create_task(write(section))
+        try:
+            return await asyncio.gather(*tasks.values())
+        except BaseException:
+            # One failed section fails the post; stop the ones still waiting or running
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
     def review_post(self, topic: str, plan: OrchestratorPlan) -> ReviewFeedback:
         """Reviewer: Analyze and improve overall cohesion"""
         sections_text = "\n\n".join(
             [
-                f"=== {section_type} ===\n{content.content}"
-                for section_type, content in self.sections_content.items()
+                f"=== {section_label(section)} ===\n{self.sections_content[section.id].content}"
+                for section in plan.sections
+                if section.id in self.sections_content
             ]
         )
 
-        response = client.models.generate_content(
+        response = generate_content(
             model=model,
             contents=REVIEWER_PROMPT.format(
                 topic=topic,
@@ -201,11 +307,12 @@ class BlogOrchestrator:
         print(f"Blog structure planned: {len(plan.sections)} sections")
         print(f"Blog structure planned: {plan.model_dump_json(indent=2)}")
 
-        # Write each section
-        for section in plan.sections:
-            print(f"Writing section: {section.section_type}")
-            content = self.write_section(topic, section)
-            self.sections_content[section.section_type] = content
+        # Independent sections are written concurrently; dependent ones wait for their predecessors
+        start = time.perf_counter()
+        contents = run_sync(self.awrite_sections(topic, plan.sections))
+        for section, content in zip(plan.sections, contents):
+            self.sections_content[section.id] = content
+        print(f"Wrote {len(contents)} sections in {time.perf_counter() - start:.1f}s")
 
         # Review and polish
         print("Reviewing full blog post")
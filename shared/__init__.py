@@ -0,0 +1 @@
+"""Building blocks shared by the agent examples (Gemini client, caches, runtime)."""
@@ -0,0 +1,136 @@
+"""
+Forecast cache for the Open-Meteo weather tools.
+
+Coordinates are rounded to a grid (0.1° ≈ 11 km by default) and the forecast
+is requested for the grid point, so everyone asking about the same city
+shares one entry. Entries expire at the next forecast-update boundary
+(every ``update_interval`` seconds, aligned to UTC) instead of after a fixed
+TTL. Recently expired entries are still served while a background thread
+refreshes them, and concurrent misses for the same cell share one request.
+
+Usage:
+    forecast_cache = ForecastCache()
+    forecast_cache.get(latitude, longitude, fetch=fetch_forecast, variant="daily-min-max")
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from shared.single_flight import SingleFlight
+
+Fetch = Callable[[float, float], Optional[Dict[str, Any]]]
+
+
+@dataclass
+class _Entry:
+    value: Dict[str, Any]
+    expires_at: float
+
+
+class ForecastCache:
+    """
+    Grid-quantized forecast cache with update-boundary expiry and stale-while-revalidate.
+
+    Parameters:
+        grid (float): Grid size in degrees coordinates are rounded to.
+        update_interval (float): Seconds between forecast updates upstream.
+            Entries expire at the next multiple of this interval.
+        max_stale (float): How long after expiry an entry may still be served
+            while it is refreshed in the background.
+    """
+
+    def __init__(self, grid: float = 0.1, update_interval: float = 3600, max_stale: float = 3600):
+        self.grid = grid
+        self.update_interval = update_interval
+        self.max_stale = max_stale
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def quantize(self, latitude: float, longitude: float) -> Tuple[float, float]:
+        """Round coordinates to the cache grid."""
+        digits = max(0, -math.floor(math.log10(self.grid)) + 1)
+        return (
+            round(round(latitude / self.grid) * self.grid, digits),
+            round(round(longitude / self.grid) * self.grid, digits),
+        )
+
+    def next_update(self, now: float) -> float:
+        """Timestamp of the next forecast-update boundary after ``now``."""
+        return (math.floor(now / self.update_interval) + 1) * self.update_interval
+
+    def get(self, latitude: float, longitude: float, fetch: Fetch, variant: Hashable = None) -> Optional[Dict[str, Any]]:
+        """
+        Return the forecast for the grid cell containing the coordinates.
+
+        Parameters:
+            latitude (float): Latitude of the location.
+            longitude (float): Longitude of the location.
+            fetch: Called with the quantized (latitude, longitude) on a miss;
+                returns the forecast dict or None if the request failed.
+            variant: Distinguishes different request parameters for the same cell.
+
+        Returns:
+            dict: A copy of the cached forecast, or None if it could not be fetched.
+        """
+        lat, lon = self.quantize(latitude, longitude)
+        key = (lat, lon, variant)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and now < entry.expires_at:
+            self.hits += 1
+            return dict(entry.value)
+
+        if entry is not None and now < entry.expires_at + self.max_stale:
+            # Serve the old forecast now and refresh it in the background
+            self.stale_hits += 1
+            if not self._flight.in_flight(key):
+                threading.Thread(
+                    target=self._refresh_quietly, args=(key, lat, lon, fetch), daemon=True
+                ).start()
+            return dict(entry.value)
+
+        self.misses += 1
+        value = self._flight.do(key, lambda: self._refresh(key, lat, lon, fetch))
+        return dict(value) if value is not None else None
+
+    def peek(self, latitude: float, longitude: float, variant: Hashable = None) -> Optional[Dict[str, Any]]:
+        """Return a fresh cached forecast without fetching, or None."""
+        lat, lon = self.quantize(latitude, longitude)
+        with self._lock:
+            entry = self._entries.get((lat, lon, variant))
+        if entry is not None and time.time() < entry.expires_at:
+            self.hits += 1
+            return dict(entry.value)
+        return None
+
+    def prime(self, latitude: float, longitude: float, value: Dict[str, Any], variant: Hashable = None):
+        """Store a forecast fetched elsewhere (e.g. in a bulk request)."""
+        lat, lon = self.quantize(latitude, longitude)
+        with self._lock:
+            self._entries[(lat, lon, variant)] = _Entry(dict(value), self.next_update(time.time()))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh(self, key: Hashable, lat: float, lon: float, fetch: Fetch) -> Optional[Dict[str, Any]]:
+        value = fetch(lat, lon)
+        # Failed requests are not cached; a stale entry stays until it is too old
+        if value is not None:
+            with self._lock:
+                self._entries[key] = _Entry(dict(value), self.next_update(time.time()))
+        return value
+
+    def _refresh_quietly(self, key: Hashable, lat: float, lon: float, fetch: Fetch):
+        try:
+            self._flight.do(key, lambda: self._refresh(key, lat, lon, fetch))
+        except Exception as e:
+            print(f"Error refreshing forecast: {e}")
@@ -0,0 +1,254 @@
+"""
+Shared Gemini client used by every agent example.
+
+All examples go through one lazily created ``genai.Client`` so that the
+underlying HTTP connection pool is reused between calls instead of being
+rebuilt for every script/module. One process-wide max-in-flight limit keeps
+the number of concurrent model calls under our quota; sync calls from any
+thread and async calls from any event loop share it.
+
+Usage:
+    from shared.gemini_client import generate_content, agenerate_content
+
+    response = generate_content(model="gemini-2.0-flash", contents="Hello")
+    response = await agenerate_content(model="gemini-2.0-flash", contents="Hello")
+
+For structured (JSON schema) calls, ``generate_structured`` and
+``agenerate_structured`` return the parsed object directly and can be given a
+``ResponseCache`` to skip repeated identical calls. Identical structured calls
+(same model, contents and schema) that are in flight at the same time are
+coalesced into one request, whether or not a cache is used.
+"""
+import asyncio
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Optional
+
+import httpx
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+
+from shared.response_cache import ResponseCache, make_cache_key
+from shared.single_flight import AsyncSingleFlight, SingleFlight
+
+# Load environment variables from .env file
+load_dotenv()
+
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))
+
+_settings = {
+    "max_connections": DEFAULT_MAX_CONNECTIONS,
+    "max_in_flight": DEFAULT_MAX_IN_FLIGHT,
+}
+_client: Optional[genai.Client] = None
+_client_lock = threading.Lock()
+
+
+class _InFlightLimit:
+    """
+    Counting limit shared by threads and event loops.
+
+    asyncio primitives are bound to one loop and threading ones block the
+    loop, so waiters queue here in FIFO order: threads wait on an Event,
+    coroutines on a future of their own loop. A released slot is handed
+    directly to the first waiter.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        # threading.Event (sync) or (loop, future) (async)
+        self._waiters: Deque[Any] = deque()
+
+    def __enter__(self):
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return self
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return self
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot was handed over just before the cancellation
+            self.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                try:
+                    loop.call_soon_threadsafe(_hand_over, future)
+                    return
+                except RuntimeError:
+                    # Its loop is closed; try the next waiter
+                    continue
+            self.in_flight -= 1
+
+
+def _hand_over(future: asyncio.Future):
+    # A future cancelled in the meantime releases the slot from its waiter
+    if not future.done():
+        future.set_result(None)
+
+
+_slots = _InFlightLimit(DEFAULT_MAX_IN_FLIGHT)
+# Coalesce identical structured calls that are in flight at the same time
+_flight = SingleFlight()
+_async_flight = AsyncSingleFlight()
+
+
+def configure(max_in_flight: Optional[int] = None, max_connections: Optional[int] = None):
+    """
+    Change the concurrency settings. Must be called before the first request.
+
+    Parameters:
+        max_in_flight (int): Maximum number of model calls running at the same time.
+        max_connections (int): Size of the HTTP connection pool.
+    """
+    global _slots
+    with _client_lock:
+        if _client is not None:
+            raise RuntimeError("configure() must be called before the client is created")
+        if max_connections is not None:
+            _settings["max_connections"] = max_connections
+        if max_in_flight is not None:
+            _settings["max_in_flight"] = max_in_flight
+            _slots = _InFlightLimit(max_in_flight)
+
+
+def get_client() -> genai.Client:
+    """Return the process-wide Gemini client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                limits = httpx.Limits(
+                    max_connections=_settings["max_connections"],
+                    max_keepalive_connections=_settings["max_connections"],
+                )
+                _client = genai.Client(
+                    api_key=os.getenv("GOOGLE_AI_API_KEY"),
+                    http_options=types.HttpOptions(
+                        client_args={"limits": limits},
+                        async_client_args={"limits": limits},
+                    ),
+                )
+    return _client
+
+
+def generate_content(**kwargs) -> types.GenerateContentResponse:
+    """Blocking ``client.models.generate_content`` bounded by the in-flight limit."""
+    client = get_client()
+    with _slots:
+        return client.models.generate_content(**kwargs)
+
+
+async def agenerate_content(**kwargs) -> types.GenerateContentResponse:
+    """Async ``client.aio.models.generate_content`` bounded by the in-flight limit."""
+    client = get_client()
+    async with _slots:
+        return await client.aio.models.generate_content(**kwargs)
+
+
+def embed_content(**kwargs) -> types.EmbedContentResponse:
+    """Blocking ``client.models.embed_content`` bounded by the in-flight limit."""
+    client = get_client()
+    with _slots:
+        return client.models.embed_content(**kwargs)
+
+
+def _structured_config(schema) -> dict:
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": schema,
+    }
+
+
+def generate_structured(model: str, contents, schema, cache: Optional[ResponseCache] = None,
+                        coalesce: bool = True):
+    """
+    Run a structured generate_content call and return the parsed response.
+
+    Parameters:
+        model (str): Model id.
+        contents: Prompt passed to generate_content.
+        schema: Response schema (a Pydantic model or e.g. ``list[Model]``).
+        cache (ResponseCache): Optional cache keyed on (model, contents, schema).
+        coalesce (bool): Share one request between identical calls running at the same time.
+
+    Returns:
+        The parsed response object.
+    """
+    key = make_cache_key(model, contents, schema)
+    if cache is not None:
+        cached = cache.get(key, schema)
+        if cached is not None:
+            return cached
+
+    def call():
+        response = generate_content(model=model, contents=contents, config=_structured_config(schema))
+        result = response.parsed
+        if cache is not None and result is not None:
+            cache.set(key, schema, result)
+        return result
+
+    return _flight.do(key, call) if coalesce else call()
+
+
+async def agenerate_structured(model: str, contents, schema, cache: Optional[ResponseCache] = None,
+                               coalesce: bool = True):
+    """Async version of ``generate_structured``."""
+    key = make_cache_key(model, contents, schema)
+    if cache is not None:
+        cached = cache.get(key, schema)
+        if cached is not None:
+            return cached
+
+    async def call():
+        response = await agenerate_content(model=model, contents=contents, config=_structured_config(schema))
+        result = response.parsed
+        if cache is not None and result is not None:
+            cache.set(key, schema, result)
+        return result
+
+    return await _async_flight.do(key, call) if coalesce else await call()
+
+
+def coalescing_stats() -> dict:
+    """How many structured calls were sent and how many shared an in-flight call."""
+    return {
+        "executed": _flight.executed + _async_flight.executed,
+        "shared": _flight.shared + _async_flight.shared,
+    }
@@ -0,0 +1,230 @@
+"""
+Content-addressed cache for structured ``generate_content`` calls.
+
+Entries are keyed on (model, prompt, response_schema) and store the already
+parsed Pydantic object, so repeated classifications with identical inputs
+skip both the model call and the JSON parsing. The in-memory layer uses LRU
+eviction with an optional TTL; an optional SQLite backend keeps entries
+across process restarts.
+
+Usage:
+    cache = ResponseCache(max_entries=1024, ttl_seconds=3600)
+    result = generate_structured(model, prompt, MySchema, cache=cache)
+    print(cache.stats())
+"""
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from pydantic import BaseModel, TypeAdapter
+
+
+@functools.lru_cache(maxsize=None)
+def _type_adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def _canonical(value: Any) -> Any:
+    """Convert prompt contents to plain JSON-compatible data for hashing."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    return value
+
+
+def make_cache_key(model: str, contents: Any, schema) -> str:
+    """Return a stable hash for a (model, prompt, response_schema) triple."""
+    schema_json = _type_adapter(schema).json_schema()
+    payload = json.dumps(
+        {"model": model, "contents": _canonical(contents), "schema": schema_json},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    disk_hits: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class SQLiteBackend:
+    """On-disk store for cached responses, shared between processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the stored JSON for a key, or None if missing or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < time.time():
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return value
+
+    def set(self, key: str, value: str, expires_at: Optional[float]):
+        """Store the JSON for a key."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every stored response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """LRU/TTL cache of parsed structured responses with an optional disk backend."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = None,
+        backend: Optional[SQLiteBackend] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self._entries: "OrderedDict[str, tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def get(self, key: str, schema) -> Optional[Any]:
+        """
+        Return the cached parsed object for a key.
+
+        Parameters:
+            key (str): Key returned by ``make_cache_key``.
+            schema: Response schema used to re-parse entries loaded from disk.
+
+        Returns:
+            The parsed object, or None on a miss. Returned objects are shared
+            between callers and should be treated as read-only.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self._stats.hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.backend is not None:
+            stored = self.backend.get(key)
+            if stored is not None:
+                value = _type_adapter(schema).validate_json(stored)
+                with self._lock:
+                    self._store(key, value, self._expiry(now))
+                    self._stats.hits += 1
+                    self._stats.disk_hits += 1
+                return value
+
+        with self._lock:
+            self._stats.misses += 1
+        return None
+
+    def set(self, key: str, schema, value: Any):
+        """Cache a parsed object under a key (and on disk if a backend is set)."""
+        expires_at = self._expiry(time.time())
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self.backend is not None:
+            stored = _type_adapter(schema).dump_json(value).decode("utf-8")
+            self.backend.set(key, stored, expires_at)
+
+    def clear(self):
+        """Drop every entry from memory and disk and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._stats = CacheStats()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the hit/miss counters."""
+        with self._lock:
+            return CacheStats(**vars(self._stats))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expiry(self, now: float) -> Optional[float]:
+        return now + self.ttl_seconds if self.ttl_seconds is not None else None
+
+    def _store(self, key: str, value: Any, expires_at: Optional[float]):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ResponseCache:
+    """
+    Return the process-wide response cache used by the classifier calls.
+
+    Set ``GEMINI_CACHE_DB`` to a file path to persist entries in SQLite and
+    ``GEMINI_CACHE_TTL`` to expire them after the given number of seconds.
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                db_path = os.getenv("GEMINI_CACHE_DB")
+                ttl = os.getenv("GEMINI_CACHE_TTL")
+                _default_cache = ResponseCache(
+                    max_entries=int(os.getenv("GEMINI_CACHE_SIZE", "1024")),
+                    ttl_seconds=float(ttl) if ttl else None,
+                    backend=SQLiteBackend(db_path) if db_path else None,
+                )
+    return _default_cache
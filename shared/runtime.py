@@ -0,0 +1,103 @@
+"""
+Process-wide asyncio runtime for sync code.
+
+One event loop runs for the lifetime of the process in a background daemon
+thread. Sync callers hand it coroutines instead of calling ``asyncio.run``
+each time, so the loop, and with it the ``client.aio`` HTTP connections, is
+created once and stays warm between calls. This also works when the caller
+already runs inside another event loop (e.g. a notebook), which is what
+``nest_asyncio`` was used for.
+
+Usage:
+    from shared.runtime import run_sync, submit
+
+    response = run_sync(agenerate_content(model=..., contents=...))
+    future = submit(some_coroutine())   # concurrent.futures.Future
+"""
+import asyncio
+import atexit
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the runtime loop, starting its thread on first use."""
+    global _loop, _thread
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                _thread = threading.Thread(target=run, name="async-runtime", daemon=True)
+                _thread.start()
+                ready.wait()
+                _loop = loop
+    return _loop
+
+
+def submit(coro: Coroutine) -> Future:
+    """Schedule ``coro`` on the runtime loop and return a ``concurrent.futures.Future`` for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """
+    Run ``coro`` on the runtime loop and block until it finishes.
+
+    Parameters:
+        coro: The coroutine to run.
+        timeout (float): Seconds to wait; the coroutine is cancelled if it takes longer.
+
+    Returns:
+        The coroutine's result (its exception is raised here).
+    """
+    if _thread is not None and threading.current_thread() is _thread:
+        coro.close()
+        raise RuntimeError("run_sync() cannot be called from the runtime loop; await the coroutine instead")
+    future = submit(coro)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        # Timeout or KeyboardInterrupt: do not leave the work running in the background
+        future.cancel()
+        raise
+
+
+def shutdown(timeout: float = 5.0):
+    """Cancel what is still running and stop the loop (called automatically at exit)."""
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop = _thread = None
+    if loop is None:
+        return
+
+    async def cancel_all():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await loop.shutdown_asyncgens()
+
+    try:
+        asyncio.run_coroutine_threadsafe(cancel_all(), loop).result(timeout)
+    except Exception:
+        pass
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout)
+    if not thread.is_alive():
+        loop.close()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,123 @@
+"""
+Request coalescing ("single flight").
+
+When several callers ask for the same key at the same time, only the first
+one runs the work; the others wait for and share its result (or exception).
+Nothing is kept after the call finishes, so there is no staleness risk.
+
+Usage:
+    flight = SingleFlight()
+    result = flight.do(key, lambda: expensive_call())
+
+    async_flight = AsyncSingleFlight()
+    result = await async_flight.do(key, lambda: expensive_coroutine())
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key across threads."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """Run ``func`` unless a call with the same key is in flight; then wait for its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether a call with this key is currently running."""
+        with self._lock:
+            return key in self._calls
+
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent coroutine calls with the same key within an event loop.
+
+    The work runs in its own task and every caller awaits it through
+    ``asyncio.shield``, so a caller that is cancelled (e.g. by a timeout) does
+    not cancel the call the other callers are waiting for. When the last
+    waiting caller is cancelled, the call itself is cancelled too.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], _AsyncCall] = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``func()`` unless a call with the same key is in flight; then await its result."""
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        call = self._calls.get(call_key)
+        if call is None:
+            call = _AsyncCall(loop.create_task(func()))
+            self._calls[call_key] = call
+            call.task.add_done_callback(lambda done: self._forget(call_key, done))
+            self.executed += 1
+        else:
+            self.shared += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether a call with this key is currently running on the current event loop."""
+        return (asyncio.get_running_loop(), key) in self._calls
+
+    def _forget(self, call_key: Tuple[asyncio.AbstractEventLoop, Hashable], task: asyncio.Task):
+        self._calls.pop(call_key, None)
+        # Every caller re-raises the error; mark it retrieved in case all of them were cancelled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,290 @@
+"""
+Reusable function-calling loop for Gemini.
+
+Register plain Python functions in a ``ToolRegistry``; their
+``FunctionDeclaration``s are generated from the signature (type hints and
+defaults) and the docstring (first paragraph as description, the
+``Parameters:`` section for argument descriptions). ``run_tool_loop`` then
+sends the prompt, executes *every* ``function_call`` part of a response
+concurrently, sends all results back in one turn, and repeats until the
+model answers with text or ``max_rounds`` is reached.
+
+Usage:
+    registry = ToolRegistry([get_weather])
+    result = run_tool_loop("What is the weather in Konya and Izmir?", registry)
+    print(result.text)
+"""
+import asyncio
+import inspect
+import re
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from google.genai import types
+
+from shared.gemini_client import agenerate_content, generate_content
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+_JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    dict: "object",
+    list: "array",
+}
+
+_PARAM_LINE = re.compile(r"^\s*(\w+)\s*(?:\(([^)]*)\))?\s*:\s*(.+)$")
+
+
+def _json_schema(annotation) -> Dict[str, Any]:
+    """Map a Python type hint to a JSON schema dict understood by Gemini."""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        non_null = [arg for arg in args if arg is not type(None)]
+        schema = _json_schema(non_null[0]) if len(non_null) == 1 else {"type": "string"}
+        if len(non_null) < len(args):
+            schema["nullable"] = True
+        return schema
+    if origin in (list, List, tuple):
+        schema = {"type": "array"}
+        if args:
+            schema["items"] = _json_schema(args[0])
+        return schema
+    if origin in (dict, Dict):
+        return {"type": "object"}
+    return {"type": _JSON_TYPES.get(annotation, "string")}
+
+
+def _parse_docstring(doc: str):
+    """Return (description, {parameter: description}) from a docstring."""
+    doc = inspect.cleandoc(doc or "")
+    description_lines = []
+    params: Dict[str, str] = {}
+    section = "description"
+    for line in doc.splitlines():
+        stripped = line.strip()
+        heading = stripped.rstrip(":").lower()
+        if stripped.endswith(":") and heading in ("parameters", "args", "arguments"):
+            section = "params"
+            continue
+        if stripped.endswith(":") and heading in ("returns", "return", "raises", "example", "examples"):
+            section = "other"
+            continue
+        if section == "description":
+            if not stripped and description_lines:
+                section = "other"
+            elif stripped:
+                description_lines.append(stripped)
+        elif section == "params":
+            match = _PARAM_LINE.match(line)
+            if match:
+                params[match.group(1)] = match.group(3).strip()
+    return " ".join(description_lines), params
+
+
+def function_declaration(func: Callable) -> types.FunctionDeclaration:
+    """Build a ``FunctionDeclaration`` from a function's signature and docstring."""
+    description, param_docs = _parse_docstring(func.__doc__)
+    hints = typing.get_type_hints(func)
+    properties = {}
+    required = []
+    for name, param in inspect.signature(func).parameters.items():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        schema = _json_schema(hints.get(name, str))
+        if name in param_docs:
+            schema["description"] = param_docs[name]
+        properties[name] = schema
+        if param.default is inspect.Parameter.empty:
+            required.append(name)
+
+    parameters = None
+    if properties:
+        parameters = {"type": "object", "properties": properties, "required": required}
+    return types.FunctionDeclaration(
+        name=func.__name__,
+        description=description or func.__name__,
+        parameters=parameters,
+    )
+
+
+class ToolRegistry:
+    """Maps tool names to Python callables and their generated declarations."""
+
+    def __init__(self, functions: Iterable[Callable] = ()):
+        self.functions: Dict[str, Callable] = {}
+        self.declarations: Dict[str, types.FunctionDeclaration] = {}
+        for func in functions:
+            self.register(func)
+
+    def register(self, func: Callable) -> Callable:
+        """Register a function. Can be used as a decorator."""
+        self.functions[func.__name__] = func
+        self.declarations[func.__name__] = function_declaration(func)
+        return func
+
+    def tool(self) -> types.Tool:
+        return types.Tool(function_declarations=list(self.declarations.values()))
+
+    def call(self, function_call: types.FunctionCall) -> Dict[str, Any]:
+        """Run one function call and return a JSON-compatible response dict."""
+        func = self.functions.get(function_call.name)
+        if func is None:
+            return {"error": f"Unknown function: {function_call.name}"}
+        try:
+            result = func(**(function_call.args or {}))
+        except Exception as e:
+            # Errors are reported back to the model instead of ending the loop
+            return {"error": f"{type(e).__name__}: {e}"}
+        return result if isinstance(result, dict) else {"result": result}
+
+    async def acall(self, function_call: types.FunctionCall) -> Dict[str, Any]:
+        """Async version of ``call``; coroutine functions are awaited, others run in a thread."""
+        func = self.functions.get(function_call.name)
+        if func is None or not inspect.iscoroutinefunction(func):
+            return await asyncio.to_thread(self.call, function_call)
+        try:
+            result = await func(**(function_call.args or {}))
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        return result if isinstance(result, dict) else {"result": result}
+
+
+@dataclass
+class ToolCallRecord:
+    name: str
+    args: Dict[str, Any]
+    response: Dict[str, Any]
+
+
+@dataclass
+class ToolLoopResult:
+    text: Optional[str]
+    rounds: int
+    calls: List[ToolCallRecord] = field(default_factory=list)
+    contents: List[types.Content] = field(default_factory=list)
+
+
+def _config(
+    registry: ToolRegistry, with_tools: bool, mode: str, system_instruction: Optional[str]
+) -> types.GenerateContentConfig:
+    if not with_tools:
+        return types.GenerateContentConfig(system_instruction=system_instruction)
+    return types.GenerateContentConfig(
+        system_instruction=system_instruction,
+        tools=[registry.tool()],
+        tool_config=types.ToolConfig(
+            function_calling_config=types.FunctionCallingConfig(mode=mode)
+        ),
+        # The loop below executes the calls itself
+        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
+    )
+
+
+def _function_calls(response: types.GenerateContentResponse) -> List[types.FunctionCall]:
+    if not response.candidates or not response.candidates[0].content:
+        return []
+    return [part.function_call for part in response.candidates[0].content.parts or [] if part.function_call]
+
+
+def _response_content(calls: List[types.FunctionCall], responses: List[Dict[str, Any]]) -> types.Content:
+    return types.Content(
+        role="user",
+        parts=[
+            types.Part(function_response=types.FunctionResponse(id=call.id, name=call.name, response=response))
+            for call, response in zip(calls, responses)
+        ],
+    )
+
+
+def _initial_contents(prompt) -> List[types.Content]:
+    if isinstance(prompt, str):
+        return [types.Content(role="user", parts=[types.Part(text=prompt)])]
+    return list(prompt)
+
+
+def run_tool_loop(
+    prompt,
+    registry: ToolRegistry,
+    model: str = DEFAULT_MODEL,
+    max_rounds: int = 5,
+    max_workers: int = 8,
+    system_instruction: Optional[str] = None,
+    require_tool_call: bool = False,
+) -> ToolLoopResult:
+    """
+    Let the model call tools until it answers with text.
+
+    Parameters:
+        prompt: User prompt (str) or a list of ``types.Content``.
+        registry (ToolRegistry): Tools the model may call.
+        model (str): Model id.
+        max_rounds (int): Maximum number of tool-calling rounds. After that
+            the model is asked once more without tools to force an answer.
+        max_workers (int): Maximum number of tool calls running at the same time.
+        system_instruction (str): Optional system instruction.
+        require_tool_call (bool): Force the model to call a tool in the first round.
+
+    Returns:
+        ToolLoopResult: Final text, number of rounds, every tool call made and the conversation.
+    """
+    contents = _initial_contents(prompt)
+    result = ToolLoopResult(text=None, rounds=0, contents=contents)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            with_tools = result.rounds < max_rounds
+            mode = "ANY" if require_tool_call and result.rounds == 0 else "AUTO"
+            response = generate_content(
+                model=model, contents=contents, config=_config(registry, with_tools, mode, system_instruction)
+            )
+            calls = _function_calls(response) if with_tools else []
+            if not calls:
+                result.text = response.text
+                return result
+
+            result.rounds += 1
+            # Independent calls from the same turn run concurrently
+            responses = list(executor.map(registry.call, calls))
+            result.calls.extend(
+                ToolCallRecord(call.name, dict(call.args or {}), reply)
+                for call, reply in zip(calls, responses)
+            )
+            contents.append(response.candidates[0].content)
+            contents.append(_response_content(calls, responses))
+
+
+async def arun_tool_loop(
+    prompt,
+    registry: ToolRegistry,
+    model: str = DEFAULT_MODEL,
+    max_rounds: int = 5,
+    system_instruction: Optional[str] = None,
+    require_tool_call: bool = False,
+) -> ToolLoopResult:
+    """Async version of ``run_tool_loop``; tool calls of a turn run with ``asyncio.gather``."""
+    contents = _initial_contents(prompt)
+    result = ToolLoopResult(text=None, rounds=0, contents=contents)
+    while True:
+        with_tools = result.rounds < max_rounds
+        mode = "ANY" if require_tool_call and result.rounds == 0 else "AUTO"
+        response = await agenerate_content(
+            model=model, contents=contents, config=_config(registry, with_tools, mode, system_instruction)
+        )
+        calls = _function_calls(response) if with_tools else []
+        if not calls:
+            result.text = response.text
+            return result
+
+        result.rounds += 1
+        responses = await asyncio.gather(*(registry.acall(call) for call in calls))
+        result.calls.extend(
+            ToolCallRecord(call.name, dict(call.args or {}), reply)
+            for call, reply in zip(calls, responses)
+        )
+        contents.append(response.candidates[0].content)
+        contents.append(_response_content(calls, responses))